@@ -3,126 +3,101 @@ import logging
 from flask import Flask
 from flask_socketio import SocketIO
 from .config import Config
+from .commands import register_commands
 from .models.db import db
 from .routes.microcontrolleur import microcontrolleur_bp
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from .routes.analytics import analytics_bp
+from .routes.presence import presence_bp
+from .routes.metrics import metrics_bp
+from .routes.socket_events import register_socket_events
+from .utils.realtime import NotificationListener, uri_to_dsn
+from .utils.pubsub import socketio_options
+from .utils.partitions import run_maintenance_forever
+from .utils.cache import cache_stats
+from .utils.rules import evaluate_rows, rule_engine, run_heartbeats_forever
+from .utils.latest import latest_store, warm_latest_store
+from .utils import metrics
 import threading
-import json
-from urllib.parse import urlparse
-import time
-from tenacity import retry, stop_after_attempt, wait_fixed
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=Config.LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 db.init_app(app)
+metrics.init_app(app)
 
 # Initialize Flask-SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With SOCKETIO_MESSAGE_QUEUE set, several worker processes share clients and emits
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options(app.config))
+multi_worker = bool(app.config['SOCKETIO_MESSAGE_QUEUE'])
 
 app.register_blueprint(microcontrolleur_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(presence_bp)
+app.register_blueprint(metrics_bp)
+register_commands(app)
+
+listener = NotificationListener(
+    socketio,
+    uri_to_dsn(app.config['SQLALCHEMY_DATABASE_URI']),
+    flush_interval=app.config['REALTIME_FLUSH_INTERVAL'],
+    legacy_events=app.config['REALTIME_LEGACY_EVENTS'],
+    queue_size=app.config['REALTIME_QUEUE_SIZE'],
+    queue_policy=app.config['REALTIME_QUEUE_POLICY'],
+    max_backoff=app.config['REALTIME_MAX_BACKOFF'],
+    leader_lock_key=app.config['REALTIME_LEADER_LOCK_KEY'] if multi_worker else None,
+    leader_retry=app.config['REALTIME_LEADER_RETRY'],
+    shared_subscriptions=multi_worker,
+    subscription_sync=app.config['REALTIME_SUBSCRIPTION_SYNC'],
+    subscription_ttl=app.config['REALTIME_SUBSCRIPTION_TTL']
+)
+
+metrics.REGISTRY.add_collector(metrics.listener_collector(listener))
+metrics.REGISTRY.add_collector(metrics.cache_collector(cache_stats))
+
+register_socket_events(socketio, listener.subscriptions, set(app.config['REALTIME_RATE_LIMITS_MS']),
+                       app.config['REALTIME_MAX_ROOMS'])
+
+# Every worker resolves new_data (standbys included), so latest values stay current
+# whichever worker holds the listener election; alert rules only run on the elected
+# listener, which sees every board's samples in commit order
+listener.row_hooks.append(latest_store.update_rows)
+if app.config['ALERT_RULES_ENABLED']:
+    listener.leader_row_hooks.append(lambda rows: evaluate_rows(app, rows))
+
+_background_started = False
+
+
+def start_background_tasks():
+    # Server entry points only (__main__ below, backend/wsgi.py): `flask` CLI commands
+    # import this module too and must not listen, sweep heartbeats or run maintenance
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+
+    # Start the notification listener threads (they reconnect on their own); with
+    # several workers they stand by until this process wins the listener election
+    listener.start()
+
+    # Load the newest value of every sensor for snapshots
+    threading.Thread(target=warm_latest_store, args=(app,), daemon=True).start()
+
+    # Create upcoming donneescapteurs partitions and apply the retention policy
+    if app.config['PARTITIONING_ENABLED']:
+        threading.Thread(target=run_maintenance_forever, args=(app,), daemon=True).start()
+
+    # Missing-heartbeat alerts, raised by the worker running the listener
+    if app.config['ALERT_RULES_ENABLED']:
+        threading.Thread(target=run_heartbeats_forever, args=(app, rule_engine, lambda: listener.is_leader),
+                         daemon=True).start()
 
-# Function to convert SQLAlchemy URI to psycopg2 DSN
-def uri_to_dsn(uri):
-    parsed = urlparse(uri)
-    dbname = parsed.path.lstrip('/')
-    user = parsed.username
-    password = parsed.password
-    host = parsed.hostname
-    port = parsed.port
-    return f"dbname={dbname} user={user} password={password} host={host} port={port}"
-
-# Function to listen for PostgreSQL notifications with retry
-@retry(stop=stop_after_attempt(5), wait=wait_fixed(10))
-def listen_for_notifications():
-    try:
-        dsn = uri_to_dsn(app.config['SQLALCHEMY_DATABASE_URI'])
-        conn = psycopg2.connect(dsn)
-        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-        cursor = conn.cursor()
-        
-        channels = ['new_microcontrolleur', 'new_data', 'new_alert', 'new_presence']
-        for channel in channels:
-            cursor.execute(f"LISTEN {channel};")
-        
-        logger.info("Listening for PostgreSQL notifications...")
-        while True:
-            conn.poll()
-            while conn.notifies:
-                notify = conn.notifies.pop(0)
-                payload = json.loads(notify.payload)
-                logger.info(f"Received notification on channel {notify.channel}: {payload}")
-                
-                if notify.channel == 'new_microcontrolleur':
-                    socketio.emit('new_microcontrolleur', {'type': 'new_microcontrolleur', 'data': payload})
-                elif notify.channel == 'new_data':
-                    cursor.execute("""
-                        SELECT d.id, d.capteurid, d.valeur, d.timestamp,
-                               c.etat, t.nom AS type, t.unite, m.nom AS microcontrolleur
-                        FROM donneescapteurs d
-                        JOIN capteurs c ON d.capteurid = c.id
-                        JOIN typescapteurs t ON c.typecapteurid = t.id
-                        JOIN microcontrolleur m ON c.microcontrolleurid = m.id
-                        WHERE d.id = %s
-                    """, (payload['id'],))
-                    result = cursor.fetchone()
-                    if result:
-                        sensor_data = {
-                            'capteurid': result[1],
-                            'type': result[5],
-                            'etat': result[4],
-                            'valeur': result[2],
-                            'unite': result[6],
-                            'calibrated': True,
-                            'timestamp': result[3].isoformat() + 'Z',
-                            'microcontrolleur': result[7]
-                        }
-                        socketio.emit('new_data', {'type': 'new_data', 'data': sensor_data})
-                        logger.info(f"Emitted new_data: {sensor_data}")
-                elif notify.channel == 'new_alert':
-                    message = f"{payload['type']}: {payload['statut'].capitalize()}"
-                    if payload['capteurid']:
-                        message += f" (Sensor ID: {payload['capteurid']})"
-                    socketio.emit('new_alert', {
-                        'type': 'new_alert',
-                        'data': {
-                            'id': payload['id'],
-                            'type': payload['type'],
-                            'dateheure': payload['dateheure'],
-                            'statut': payload['statut'],
-                            'etudiantid': payload['etudiantid'],
-                            'capteurid': payload['capteurid'],
-                            'enseignantid': payload['enseignantid'],
-                            'technicienid': payload['technicienid'],
-                            'message': message
-                        }
-                    })
-                    logger.info(f"Emitted new_alert: {payload}")
-                elif notify.channel == 'new_presence':
-                    socketio.emit('new_presence', {
-                        'type': 'new_presence',
-                        'data': {
-                            'id': payload['id'],
-                            'etudiantid': payload['etudiantid'],
-                            'statut': payload['statut'],
-                            'date_heure': payload['date_heure']
-                        }
-                    })
-                    logger.info(f"Emitted new_presence: {payload}")
-    except Exception as e:
-        logger.error(f"Error in notification listener: {str(e)}")
-        raise
-
-# Start the notification listener in a separate thread
-thread = threading.Thread(target=listen_for_notifications, daemon=True)
-thread.start()
 
 if __name__ == '__main__':
+    start_background_tasks()
     with app.app_context():
         logger.info("Starting Flask-SocketIO server...")
-        socketio.run(app, host='0.0.0.0', port=8083, debug=True)
\ No newline at end of file
+        socketio.run(app, host='0.0.0.0', port=8083, debug=True)
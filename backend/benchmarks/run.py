@@ -0,0 +1,266 @@
+# backend/benchmarks/run.py
+# Load test for the ingest, query and fan-out paths. Runs the app in-process against a
+# scratch PostgreSQL database and prints (or writes) one JSON document per run:
+#
+#   python -m backend.benchmarks.run --database-url postgresql+psycopg2://u:p@localhost/bench \
+#       --reset --boards 20 --rate 1 --duration 30 --clients 10 --out bench.json
+#
+# --reset drops and recreates every table of the scratch database.
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy.sql import text
+
+# Installed on the scratch database so inserts notify like production does
+NOTIFY_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION bench_notify_new_data() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_data', json_build_object('id', NEW.id, 'timestamp', NEW.timestamp)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS bench_new_data ON donneescapteurs;
+CREATE TRIGGER bench_new_data AFTER INSERT ON donneescapteurs
+    FOR EACH ROW EXECUTE FUNCTION bench_notify_new_data();
+"""
+
+# Synthetic history for the query benchmarks, appended in SQL
+HISTORY_SQL = """
+INSERT INTO donneescapteurs (capteurid, valeur, timestamp)
+SELECT c.id, random() * 100, now() - (g * interval '1 second')
+FROM generate_series(1, :rows_per_sensor) g
+CROSS JOIN (SELECT id FROM capteurs ORDER BY id LIMIT :sensors) c
+"""
+ALERTS_SQL = """
+INSERT INTO alertes (type, dateheure, statut, capteurid)
+SELECT 'threshold', now() - (g * interval '1 minute'), 'active', (SELECT min(id) FROM capteurs)
+FROM generate_series(1, :count) g
+"""
+
+# The board metric carrying the send time, used to measure INSERT -> emit latency
+PROBE_METRIC = 'uptime_ms'
+METRICS = ['cpu', 'ram', 'temperature', 'storage', 'uptime', 'processes', 'dht_temp', 'humidity',
+           'bmp_temp', 'pressure', 'vibration', 'voltage', 'current', 'cpu_usage', 'cpu_status',
+           'ram_used', 'ram_total', 'ram_status', 'storage_used', 'storage_total', PROBE_METRIC]
+
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'count': len(ordered), 'p50': pick(0.50), 'p90': pick(0.90), 'p99': pick(0.99),
+            'max': ordered[-1], 'mean': statistics.fmean(ordered)}
+
+
+def thread_cpu_seconds(threads):
+    return sum(time.clock_gettime(time.pthread_getcpuclockid(thread.ident)) for thread in threads)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class EmitRecorder:
+    # Polls the Socket.IO test clients and turns probe values into INSERT -> emit latencies
+    def __init__(self, clients, interval=0.002):
+        self.clients = clients
+        self.interval = interval
+        self.latencies = []
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.is_set():
+            now = time.time()
+            for index, client in enumerate(self.clients):
+                for packet in client.get_received():
+                    if packet['name'] != 'new_data':
+                        continue
+                    self.frames += 1
+                    # Latency is taken from the first client only; the others measure fan-out load
+                    if index == 0:
+                        for frame in packet['args']:
+                            rows = frame['data'] if isinstance(frame['data'], list) else [frame['data']]
+                            self.latencies.extend(now - row['valeur'] / 1000 for row in rows
+                                                  if row['etat'] == PROBE_METRIC)
+            time.sleep(self.interval)
+
+
+def register_boards(client, count):
+    boards = []
+    for index in range(count):
+        response = client.post('/api/microcontrollers/register',
+                               json={'nom': f'bench-{index}', 'identifier': f'bench-{index}'})
+        boards.append(response.get_json()['id'])
+    return boards
+
+
+def post_metrics(app, boards, rate, duration, latencies, errors):
+    client = app.test_client()
+    period = 1 / rate
+    deadline = time.monotonic() + duration
+    next_post = time.monotonic()
+    while time.monotonic() < deadline:
+        for board in boards:
+            now = time.time()
+            metrics = {name: 1.0 for name in METRICS}
+            metrics[PROBE_METRIC] = now * 1000
+            started = time.perf_counter()
+            response = client.post('/api/device-metrics', json={
+                'microcontrolleurid': board,
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'metrics': metrics
+            })
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 201:
+                errors.append(response.status_code)
+        next_post += period
+        time.sleep(max(0, next_post - time.monotonic()))
+
+
+def bench_ingest(app_module, args):
+    app, socketio, listener = app_module.app, app_module.socketio, app_module.listener
+    client = app.test_client()
+    boards = register_boards(client, args.boards)
+    clients = [socketio.test_client(app) for _ in range(args.clients)]
+    recorder = EmitRecorder(clients)
+
+    # Idle listener CPU first, then under load
+    time.sleep(1)
+    idle_started = thread_cpu_seconds(listener.threads)
+    time.sleep(args.idle)
+    idle_cpu = thread_cpu_seconds(listener.threads) - idle_started
+
+    recorder.start()
+    request_latencies, errors = [], []
+    workers = [threading.Thread(target=post_metrics,
+                                args=(app, boards[index::args.threads], args.rate, args.duration,
+                                      request_latencies, errors))
+               for index in range(min(args.threads, len(boards)))]
+    load_started = thread_cpu_seconds(listener.threads)
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    time.sleep(args.drain)
+    load_cpu = thread_cpu_seconds(listener.threads) - load_started
+    recorder.stop()
+    for socket_client in clients:
+        socket_client.disconnect()
+
+    samples = len(request_latencies) * len(METRICS)
+    return {
+        'requests': len(request_latencies),
+        'errors': len(errors),
+        'samples_per_second': samples / elapsed if elapsed else None,
+        'request_latency_s': percentiles(request_latencies),
+        'insert_to_emit_s': percentiles(recorder.latencies),
+        'frames_received': recorder.frames,
+        'listener': listener.stats(),
+        'listener_cpu_idle_fraction': idle_cpu / args.idle,
+        'listener_cpu_load_fraction': load_cpu / (elapsed + args.drain)
+    }
+
+
+def time_requests(client, path, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}')
+    return percentiles(latencies)
+
+
+def bench_queries(app_module, args):
+    from backend.models.db import db
+    app = app_module.app
+    client = app.test_client()
+    results = []
+    with app.app_context():
+        loaded = 0
+        for size in args.table_sizes:
+            sensors = db.session.execute(text("SELECT count(*) FROM capteurs")).scalar()
+            per_sensor = max(0, (size - loaded) // max(1, sensors))
+            if per_sensor:
+                db.session.execute(text(HISTORY_SQL), {'rows_per_sensor': per_sensor, 'sensors': sensors})
+                db.session.execute(text(ALERTS_SQL), {'count': max(1, per_sensor // 10)})
+                db.session.commit()
+            db.session.execute(text("ANALYZE donneescapteurs; ANALYZE alertes"))
+            db.session.commit()
+            loaded = db.session.execute(text("SELECT count(*) FROM donneescapteurs")).scalar()
+            results.append({
+                'rows': loaded,
+                'sensor_data_s': time_requests(client, '/api/sensor-data?limit=500', args.repeat),
+                'sensor_data_filtered_s': time_requests(client, '/api/sensor-data?limit=500&etat=temperature',
+                                                        args.repeat),
+                'alerts_s': time_requests(client, '/api/alerts?limit=500', args.repeat)
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ingest, query and fan-out paths')
+    parser.add_argument('--database-url', required=True, help='Scratch PostgreSQL database')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first')
+    parser.add_argument('--boards', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=1.0, help='Posts per second per board')
+    parser.add_argument('--duration', type=float, default=20.0, help='Ingest phase length in seconds')
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent posting threads')
+    parser.add_argument('--clients', type=int, default=5, help='Socket.IO test clients')
+    parser.add_argument('--idle', type=float, default=5.0, help='Idle CPU measurement window')
+    parser.add_argument('--drain', type=float, default=2.0, help='Wait for the last emits')
+    parser.add_argument('--table-sizes', type=int, nargs='*', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per query measurement')
+    parser.add_argument('--out', help='Write the JSON result here instead of stdout')
+    args = parser.parse_args()
+
+    # The app reads its configuration (and starts the listener) at import time
+    from backend.config import Config
+    Config.SQLALCHEMY_DATABASE_URI = args.database_url
+    from backend import app as app_module
+    from backend.models.db import db
+
+    with app_module.app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.create_all()
+        db.session.execute(text(NOTIFY_TRIGGERS_SQL))
+        db.session.commit()
+
+    result = {
+        'revision': git_revision(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'parameters': vars(args) | {'database_url': None},
+        'ingest': bench_ingest(app_module, args),
+        'queries': bench_queries(app_module, args)
+    }
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# backend/commands.py
+import json
+from datetime import date, timedelta
+import click
+from flask import current_app
+from .models.db import db, Etablissement
+from .utils.partitions import is_partitioned, list_partitions, maintain_partitions
+from .utils.rollups import backfill_rollups
+from .utils.timetable import record_absences, timetable_index
+from .utils.video import CheckpointStore, VideoPipeline, collect_clips
+
+
+def register_commands(app):
+    @app.cli.group()
+    def rollups():
+        """Maintain the donneescapteurs rollup tables."""
+
+    @rollups.command('backfill')
+    @click.option('--chunk-size', default=100000, show_default=True, help='donneescapteurs ids per transaction')
+    def rollups_backfill(chunk_size):
+        """Rebuild the minute/hour rollups from raw history."""
+        chunks = backfill_rollups(chunk_size, log=click.echo)
+        click.echo(f"Rollups rebuilt in {chunks} chunks")
+
+    @app.cli.group()
+    def partitions():
+        """Manage the donneescapteurs time partitions."""
+
+    @partitions.command('maintain')
+    @click.option('--days-ahead', type=int, default=None, help='Defaults to PARTITION_PRECREATE_DAYS')
+    @click.option('--retention-days', type=int, default=None, help='Defaults to PARTITION_RETENTION_DAYS')
+    @click.option('--export-dir', default=None, help='Defaults to PARTITION_EXPORT_DIR')
+    def partitions_maintain(days_ahead, retention_days, export_dir):
+        """Create upcoming partitions and drop expired ones."""
+        config = dict(current_app.config)
+        if days_ahead is not None:
+            config['PARTITION_PRECREATE_DAYS'] = days_ahead
+        config['PARTITION_RETENTION_DAYS'] = retention_days or config['PARTITION_RETENTION_DAYS']
+        config['PARTITION_EXPORT_DIR'] = export_dir or config['PARTITION_EXPORT_DIR']
+        if not is_partitioned():
+            raise click.ClickException('donneescapteurs is not partitioned yet (see migrations/003)')
+        created, dropped = maintain_partitions(config)
+        click.echo(f"Created {created} partitions")
+        for name in dropped:
+            click.echo(f"Dropped {name}")
+
+    @partitions.command('list')
+    def partitions_list():
+        """List the range partitions and their bounds."""
+        for name, lower, upper in list_partitions():
+            click.echo(f"{name}\t{lower.isoformat()}\t{upper.isoformat()}")
+
+    @app.cli.group()
+    def video():
+        """Detect presences in recorded camera clips."""
+
+    @video.command('process')
+    @click.argument('paths', nargs=-1, required=True)
+    @click.option('--sample-fps', type=float, default=None, help='Defaults to VIDEO_SAMPLE_FPS')
+    @click.option('--workers', type=int, default=None, help='Defaults to VIDEO_WORKERS')
+    def video_process(paths, sample_fps, workers):
+        """Process clips or directories of clips, resuming from checkpoints."""
+        config = current_app.config
+        if not config['VIDEO_DETECTOR']:
+            raise click.ClickException('Set VIDEO_DETECTOR to a module:function face embedder')
+        pipeline = VideoPipeline(
+            config['VIDEO_DETECTOR'],
+            CheckpointStore(config['VIDEO_CHECKPOINT_DIR']),
+            sample_fps=sample_fps or config['VIDEO_SAMPLE_FPS'],
+            batch_size=config['VIDEO_BATCH_SIZE'],
+            workers=workers or config['VIDEO_WORKERS'],
+            dedup_threshold=config['VIDEO_DEDUP_THRESHOLD'],
+            max_distance=config['VIDEO_MATCH_MAX_DISTANCE']
+        )
+        for report in pipeline.process(collect_clips(paths)):
+            click.echo(json.dumps(report))
+
+    @app.cli.group()
+    def presences():
+        """Compute presences from the class timetables."""
+
+    @presences.command('absences')
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Defaults to yesterday; slots still running are skipped')
+    @click.option('--etablissement', type=int, default=None, help='Defaults to every establishment')
+    def presences_absences(day, etablissement):
+        """Record an absence for every student missing from a slot of the day."""
+        day = day.date() if day else date.today() - timedelta(days=1)
+        timetable_index.load()
+        if etablissement is None:
+            etablissements = [etablissement_id for etablissement_id, in db.session.query(Etablissement.id)]
+        else:
+            etablissements = [etablissement]
+        for etablissement_id in etablissements:
+            recorded = record_absences(day, etablissement_id, current_app.config['ABSENCE_EARLY_MINUTES'])
+            click.echo(f"Etablissement {etablissement_id}: {recorded} absences recorded for {day.isoformat()}")
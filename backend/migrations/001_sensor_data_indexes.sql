@@ -0,0 +1,13 @@
+-- backend/migrations/001_sensor_data_indexes.sql
+-- Indexes backing keyset pagination and per-sensor range scans.
+-- Run outside a transaction block (CREATE INDEX CONCURRENTLY), e.g.:
+--   psql edge_ia_db -f backend/migrations/001_sensor_data_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_donneescapteurs_capteurid_timestamp
+    ON donneescapteurs (capteurid, timestamp);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_donneescapteurs_timestamp_id
+    ON donneescapteurs (timestamp, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_alertes_dateheure_id
+    ON alertes (dateheure, id);
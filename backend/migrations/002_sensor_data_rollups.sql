@@ -0,0 +1,27 @@
+-- backend/migrations/002_sensor_data_rollups.sql
+-- Per-minute and per-hour rollups of donneescapteurs, kept current by the ingest path.
+-- Build them for existing history afterwards with: flask --app backend.app rollups backfill
+
+CREATE TABLE IF NOT EXISTS donneescapteurs_minute (
+    capteurid integer NOT NULL REFERENCES capteurs (id),
+    bucket timestamp NOT NULL,
+    count integer NOT NULL,
+    sum double precision NOT NULL,
+    min double precision NOT NULL,
+    max double precision NOT NULL,
+    last double precision NOT NULL,
+    last_timestamp timestamp NOT NULL,
+    PRIMARY KEY (capteurid, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS donneescapteurs_heure (
+    capteurid integer NOT NULL REFERENCES capteurs (id),
+    bucket timestamp NOT NULL,
+    count integer NOT NULL,
+    sum double precision NOT NULL,
+    min double precision NOT NULL,
+    max double precision NOT NULL,
+    last double precision NOT NULL,
+    last_timestamp timestamp NOT NULL,
+    PRIMARY KEY (capteurid, bucket)
+);
@@ -0,0 +1,120 @@
+-- backend/migrations/003_partition_donneescapteurs.sql
+-- Turns donneescapteurs into a table range-partitioned on timestamp.
+-- The existing heap is not copied: it becomes donneescapteurs_legacy and is attached as
+-- one historical partition FROM (MINVALUE) TO (next Monday), a bound that suits both
+-- PARTITION_INTERVAL steps. The column layout, the id sequence and the row triggers
+-- (new_data NOTIFY) are carried over, so the ORM model and the listener keep working
+-- unchanged. Later ranges are created by `flask --app backend.app partitions maintain`
+-- (also run periodically by the server, see PARTITION_* in config.py).
+--
+-- Run outside a transaction block (the first part builds indexes CONCURRENTLY and
+-- validates the bound without blocking ingest), e.g.:
+--   psql edge_ia_db -f backend/migrations/003_partition_donneescapteurs.sql
+-- Until it commits, samples timestamped after next Monday are rejected.
+
+-- The partition key has to be part of the primary key
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_donneescapteurs_id_timestamp
+    ON donneescapteurs (id, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_donneescapteurs_capteurid_timestamp
+    ON donneescapteurs (capteurid, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_donneescapteurs_timestamp_id
+    ON donneescapteurs (timestamp, id);
+
+-- A validated CHECK implying the partition bound lets SET NOT NULL and ATTACH PARTITION
+-- skip scanning the heap; VALIDATE only takes a SHARE UPDATE EXCLUSIVE lock
+DO $$
+BEGIN
+    EXECUTE format('ALTER TABLE donneescapteurs ADD CONSTRAINT donneescapteurs_legacy_bound '
+                   'CHECK (valeur IS NOT NULL AND timestamp IS NOT NULL AND timestamp < %L) NOT VALID',
+                   (date_trunc('week', current_date) + interval '7 days')::timestamp);
+END;
+$$;
+ALTER TABLE donneescapteurs VALIDATE CONSTRAINT donneescapteurs_legacy_bound;
+
+BEGIN;
+
+-- Creates the missing partitions covering [first_day, last_day], one per day or week
+CREATE OR REPLACE FUNCTION ensure_donneescapteurs_partitions(first_day date, last_day date, step text DEFAULT 'day')
+RETURNS integer AS $$
+DECLARE
+    start_day date := date_trunc(step, first_day)::date;
+    next_day date;
+    part_name text;
+    created integer := 0;
+BEGIN
+    IF step NOT IN ('day', 'week') THEN
+        RAISE EXCEPTION 'Unsupported partition step %', step;
+    END IF;
+    -- Serialize concurrent callers (one per worker process)
+    PERFORM pg_advisory_xact_lock(hashtext('donneescapteurs_partitions'));
+    WHILE start_day <= last_day LOOP
+        next_day := (start_day + ('1 ' || step)::interval)::date;
+        part_name := 'donneescapteurs_p' || to_char(start_day, 'YYYYMMDD');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF donneescapteurs FOR VALUES FROM (%L) TO (%L)',
+                           part_name, start_day, next_day);
+            created := created + 1;
+        END IF;
+        start_day := next_day;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE donneescapteurs RENAME TO donneescapteurs_legacy;
+ALTER INDEX ix_donneescapteurs_capteurid_timestamp RENAME TO ix_donneescapteurs_legacy_capteurid_timestamp;
+ALTER INDEX ix_donneescapteurs_timestamp_id RENAME TO ix_donneescapteurs_legacy_timestamp_id;
+ALTER TABLE donneescapteurs_legacy ALTER COLUMN valeur SET NOT NULL;
+ALTER TABLE donneescapteurs_legacy ALTER COLUMN timestamp SET NOT NULL;
+ALTER TABLE donneescapteurs_legacy
+    DROP CONSTRAINT donneescapteurs_pkey,
+    ADD CONSTRAINT donneescapteurs_legacy_pkey PRIMARY KEY USING INDEX ix_donneescapteurs_id_timestamp;
+
+CREATE TABLE donneescapteurs (
+    id integer NOT NULL DEFAULT nextval('donneescapteurs_id_seq'),
+    capteurid integer REFERENCES capteurs (id),
+    valeur double precision NOT NULL,
+    timestamp timestamp NOT NULL,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+ALTER TABLE donneescapteurs_legacy ALTER COLUMN id DROP DEFAULT;
+ALTER SEQUENCE donneescapteurs_id_seq OWNED BY donneescapteurs.id;
+
+CREATE INDEX ix_donneescapteurs_capteurid_timestamp ON donneescapteurs (capteurid, timestamp);
+CREATE INDEX ix_donneescapteurs_timestamp_id ON donneescapteurs (timestamp, id);
+
+-- Move the row triggers (new_data NOTIFY) to the partitioned table
+DO $$
+DECLARE
+    trig record;
+BEGIN
+    FOR trig IN
+        SELECT tgname, pg_get_triggerdef(oid) AS def
+        FROM pg_trigger
+        WHERE tgrelid = 'donneescapteurs_legacy'::regclass AND NOT tgisinternal
+    LOOP
+        EXECUTE format('DROP TRIGGER %I ON donneescapteurs_legacy', trig.tgname);
+        EXECUTE regexp_replace(trig.def, ' ON (\S+\.)?donneescapteurs_legacy ', ' ON donneescapteurs ');
+    END LOOP;
+END;
+$$;
+
+-- The heap's indexes, primary key and foreign key are reused by the partition
+DO $$
+DECLARE
+    bound text;
+BEGIN
+    SELECT substring(pg_get_constraintdef(oid) FROM '''([^'']+)''') INTO bound
+    FROM pg_constraint
+    WHERE conrelid = 'donneescapteurs_legacy'::regclass AND conname = 'donneescapteurs_legacy_bound';
+    EXECUTE format('ALTER TABLE donneescapteurs ATTACH PARTITION donneescapteurs_legacy '
+                   'FOR VALUES FROM (MINVALUE) TO (%L)', bound);
+END;
+$$;
+ALTER TABLE donneescapteurs_legacy DROP CONSTRAINT donneescapteurs_legacy_bound;
+
+-- Catches rows outside every range so an ingest never fails for lack of a partition
+CREATE TABLE donneescapteurs_default PARTITION OF donneescapteurs DEFAULT;
+
+COMMIT;
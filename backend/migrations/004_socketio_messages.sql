@@ -0,0 +1,11 @@
+-- backend/migrations/004_socketio_messages.sql
+-- Spill table for Socket.IO messages larger than a NOTIFY payload
+-- (used when SOCKETIO_MESSAGE_QUEUE points at PostgreSQL).
+
+CREATE UNLOGGED TABLE IF NOT EXISTS socketio_messages (
+    id bigserial PRIMARY KEY,
+    payload text NOT NULL,
+    created_at timestamp NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_socketio_messages_created_at ON socketio_messages (created_at);
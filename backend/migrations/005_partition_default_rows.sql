@@ -0,0 +1,42 @@
+-- backend/migrations/005_partition_default_rows.sql
+-- PostgreSQL refuses to create a range partition while the DEFAULT partition holds rows
+-- in that range. Partitions are now built detached, filled with the matching rows moved
+-- out of donneescapteurs_default, then attached, so rows that landed in DEFAULT (no
+-- maintenance for a while, boards with a wrong clock) never block maintenance again.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION ensure_donneescapteurs_partitions(first_day date, last_day date, step text DEFAULT 'day')
+RETURNS integer AS $$
+DECLARE
+    start_day date := date_trunc(step, first_day)::date;
+    next_day date;
+    part_name text;
+    created integer := 0;
+BEGIN
+    IF step NOT IN ('day', 'week') THEN
+        RAISE EXCEPTION 'Unsupported partition step %', step;
+    END IF;
+    -- Serialize concurrent callers (one per worker process)
+    PERFORM pg_advisory_xact_lock(hashtext('donneescapteurs_partitions'));
+    WHILE start_day <= last_day LOOP
+        next_day := (start_day + ('1 ' || step)::interval)::date;
+        part_name := 'donneescapteurs_p' || to_char(start_day, 'YYYYMMDD');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE donneescapteurs INCLUDING DEFAULTS)', part_name);
+            EXECUTE format('WITH moved AS (DELETE FROM donneescapteurs_default '
+                           'WHERE timestamp >= %L AND timestamp < %L RETURNING id, capteurid, valeur, timestamp) '
+                           'INSERT INTO %I (id, capteurid, valeur, timestamp) SELECT * FROM moved',
+                           start_day, next_day, part_name);
+            -- Indexes, the primary key, the foreign key and the row triggers come from the parent
+            EXECUTE format('ALTER TABLE donneescapteurs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           part_name, start_day, next_day);
+            created := created + 1;
+        END IF;
+        start_day := next_day;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- backend/migrations/006_socketio_subscriptions.sql
+-- Room subscription counts published by every Socket.IO worker, so the elected
+-- listener only emits (through the message queue) to rooms someone joined.
+-- Rows of workers that stopped heartbeating are ignored, then cleaned up.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS socketio_subscriptions (
+    worker text NOT NULL,
+    room text NOT NULL,
+    rate_ms integer NOT NULL,
+    clients integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (worker, room, rate_ms)
+);
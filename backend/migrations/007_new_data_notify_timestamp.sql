@@ -0,0 +1,35 @@
+-- backend/migrations/007_new_data_notify_timestamp.sql
+-- The new_data NOTIFY payload now carries the row's timestamp next to its id, so the
+-- listener's NEW_DATA_QUERY can bound donneescapteurs.timestamp and only probe the
+-- partitions holding the batch instead of every partition's primary key.
+-- Existing row triggers notifying new_data are replaced by donneescapteurs_new_data.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION notify_donneescapteurs_new_data() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_data', json_build_object('id', NEW.id, 'timestamp', NEW.timestamp)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    trig record;
+BEGIN
+    FOR trig IN
+        SELECT t.tgname
+        FROM pg_trigger t
+        JOIN pg_proc p ON p.oid = t.tgfoid
+        WHERE t.tgrelid = 'donneescapteurs'::regclass AND NOT t.tgisinternal
+          AND p.prosrc LIKE '%''new_data''%'
+    LOOP
+        EXECUTE format('DROP TRIGGER %I ON donneescapteurs', trig.tgname);
+    END LOOP;
+END;
+$$;
+
+CREATE TRIGGER donneescapteurs_new_data AFTER INSERT ON donneescapteurs
+    FOR EACH ROW EXECUTE FUNCTION notify_donneescapteurs_new_data();
+
+COMMIT;
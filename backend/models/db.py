@@ -27,13 +27,42 @@ class Capteur(db.Model):
 
 class DonneeCapteur(db.Model):
     __tablename__ = 'donneescapteurs'
+    __table_args__ = (
+        db.Index('ix_donneescapteurs_capteurid_timestamp', 'capteurid', 'timestamp'),
+        db.Index('ix_donneescapteurs_timestamp_id', 'timestamp', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     capteurid = db.Column(db.Integer, db.ForeignKey('capteurs.id'))
     valeur = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False)
 
+class DonneeCapteurMinute(db.Model):
+    __tablename__ = 'donneescapteurs_minute'
+    capteurid = db.Column(db.Integer, db.ForeignKey('capteurs.id'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    last = db.Column(db.Float, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+
+class DonneeCapteurHeure(db.Model):
+    __tablename__ = 'donneescapteurs_heure'
+    capteurid = db.Column(db.Integer, db.ForeignKey('capteurs.id'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=False)
+    max = db.Column(db.Float, nullable=False)
+    last = db.Column(db.Float, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+
 class Alerte(db.Model):
     __tablename__ = 'alertes'
+    __table_args__ = (
+        db.Index('ix_alertes_dateheure_id', 'dateheure', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(50), nullable=False)
     dateheure = db.Column(db.DateTime, nullable=False)
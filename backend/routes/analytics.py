@@ -0,0 +1,88 @@
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from ..utils.aggregates import (aggregate_raw, aggregate_rollup, load_series_arrays, parse_bucket, require_selection,
+                                rows_to_series, selected_sensors)
+from ..utils.downsample import lttb
+from ..utils.export import export_stream
+from ..utils.rollups import plan_rollup
+from ..utils.sensor_query import parse_sensor_filters
+from ..utils.timestamps import utc_now
+from datetime import datetime
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api')
+
+@analytics_bp.route('/sensor-data/aggregate', methods=['GET'])
+def get_sensor_data_aggregate():
+    try:
+        filters = parse_sensor_filters(request.args)
+        require_selection(filters)
+        bucket = parse_bucket(request.args.get('bucket', '60'))
+        until = filters['until'] or utc_now()
+        if (until - filters['since']).total_seconds() / bucket > current_app.config['AGGREGATE_MAX_BUCKETS']:
+            raise ValueError('Too many buckets for this range, use a larger bucket')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sensors = selected_sensors(filters)
+    rollup = plan_rollup(bucket, filters['since'], filters['until']) \
+        if current_app.config['ROLLUPS_ENABLED'] else None
+    if rollup is not None:
+        rows = aggregate_rollup(rollup, filters, bucket)
+    else:
+        rows = aggregate_raw(filters, bucket)
+    series = rows_to_series(rows)
+    return jsonify({
+        'bucket': bucket,
+        'source': rollup.__tablename__ if rollup is not None else 'donneescapteurs',
+        'series': [dict(sensors.get(capteurid, {'capteurid': capteurid}), **serie)
+                   for capteurid, serie in series.items()]
+    })
+
+def parse_points(value):
+    if value is None:
+        return current_app.config['DOWNSAMPLE_DEFAULT_POINTS']
+    try:
+        points = int(value)
+    except ValueError:
+        raise ValueError('Invalid points')
+    if points < 3:
+        raise ValueError('points must be at least 3')
+    return min(points, current_app.config['DOWNSAMPLE_MAX_POINTS'])
+
+@analytics_bp.route('/sensor-data/downsample', methods=['GET'])
+def get_sensor_data_downsample():
+    try:
+        filters = parse_sensor_filters(request.args)
+        require_selection(filters)
+        points = parse_points(request.args.get('points'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    sensors = selected_sensors(filters)
+    if len(sensors) > current_app.config['DOWNSAMPLE_MAX_SERIES']:
+        return jsonify({'error': 'Too many sensors selected'}), 400
+
+    series = []
+    for capteurid, sensor in sensors.items():
+        x, y = load_series_arrays(filters, capteurid)
+        x, y = lttb(x, y, points)
+        series.append(dict(sensor, t=[datetime.utcfromtimestamp(t).isoformat() + 'Z' for t in x.tolist()],
+                           valeur=y.tolist()))
+    return jsonify({'points': points, 'series': series})
+
+EXPORT_MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+@analytics_bp.route('/sensor-data/export', methods=['GET'])
+def export_sensor_data():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        filters = parse_sensor_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    filename = f"sensor-data.{fmt}" + ('.gz' if compress else '')
+    return Response(stream_with_context(export_stream(filters, fmt, compress)),
+                    mimetype='application/gzip' if compress else EXPORT_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
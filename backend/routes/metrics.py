@@ -0,0 +1,30 @@
+from flask import Blueprint, Response, current_app, jsonify, request
+from ..utils.metrics import REGISTRY
+from ..utils.profiler import SamplingProfiler, collapsed
+
+metrics_bp = Blueprint('metrics', __name__)
+
+profiler = SamplingProfiler()
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@metrics_bp.route('/debug/profile', methods=['GET'])
+def profile():
+    # Samples every thread for a few seconds and returns collapsed stacks
+    # (feed them to flamegraph.pl or speedscope)
+    if not current_app.config['PROFILER_ENABLED']:
+        return jsonify({'error': 'Profiler is disabled'}), 404
+    try:
+        seconds = float(request.args.get('seconds', 5))
+    except ValueError:
+        return jsonify({'error': 'Invalid seconds'}), 400
+    seconds = min(max(seconds, 0.1), current_app.config['PROFILER_MAX_SECONDS'])
+
+    profiler.interval = current_app.config['PROFILER_INTERVAL']
+    try:
+        stacks = profiler.profile(seconds)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(collapsed(stacks), mimetype='text/plain')
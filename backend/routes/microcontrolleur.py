@@ -1,6 +1,11 @@
-from flask import Blueprint, jsonify, request
-from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
 from ..models.db import db, Microcontrolleur, TypeCapteur, Capteur, DonneeCapteur, Alerte
+from ..utils.ingest import parse_timestamp, resolve_sensors, resolve_type_ids, build_rows, insert_samples
+from ..utils.cache import type_cache, invalidate_microcontrolleur, cache_stats
+from ..utils.latest import latest_snapshot
+from ..utils.pagination import (encode_cursor, keyset_page, parse_int_list, parse_limit,
+                                parse_str_list, parse_time_range)
+from ..utils.sensor_query import parse_sensor_filters, sensor_data_query, serialize_sensor_row
 from sqlalchemy.sql import text
 import json
 
@@ -23,11 +28,11 @@ def register_microcontroller():
     existing = Microcontrolleur.query.filter_by(nom=data['identifier']).first()
     if existing:
         # Return existing microcontroller ID and associated sensor IDs
-        sensors = Capteur.query.filter_by(microcontrolleurid=existing.id).all()
+        sensors = resolve_sensors([existing.id]).get(existing.id, {})
         return jsonify({
             'message': 'Microcontroller already registered',
             'id': existing.id,
-            'sensors': {s.etat: s.id for s in sensors}
+            'sensors': sensors
         }), 200
 
     try:
@@ -61,13 +66,14 @@ def register_microcontroller():
             'uptime_ms': {'nom': 'Uptime', 'unite': 'ms'}
         }
         sensor_type_ids = {}
+        type_ids = resolve_type_ids({info['nom'] for info in sensor_types.values()})
         for key, info in sensor_types.items():
-            sensor_type = TypeCapteur.query.filter_by(nom=info['nom']).first()
-            if not sensor_type:
+            if info['nom'] not in type_ids:
                 sensor_type = TypeCapteur(nom=info['nom'], unite=info['unite'])
                 db.session.add(sensor_type)
                 db.session.flush()
-            sensor_type_ids[key] = sensor_type.id
+                type_ids[info['nom']] = sensor_type.id
+            sensor_type_ids[key] = type_ids[info['nom']]
 
         # Create sensors for each metric
         sensors = {}
@@ -81,11 +87,14 @@ def register_microcontroller():
             db.session.flush()
             sensors[key] = sensor.id
 
-        db.session.commit()
-
-        # Trigger notification
+        # Trigger notification, delivered to listeners (and cache invalidation) on commit
         payload = json.dumps({'id': microcontroller.id, 'nom': microcontroller.nom})
-        db.session.execute(text("NOTIFY new_microcontrolleur, :payload"), {"payload": payload})
+        db.session.execute(text("SELECT pg_notify('new_microcontrolleur', :payload)"), {"payload": payload})
+
+        db.session.commit()
+        invalidate_microcontrolleur(microcontroller.id)
+        for nom, type_id in type_ids.items():
+            type_cache.set(nom, type_id)
 
         return jsonify({
             'message': 'Microcontroller registered',
@@ -96,25 +105,33 @@ def register_microcontroller():
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@microcontrolleur_bp.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache_stats())
+
+@microcontrolleur_bp.route('/sensors/latest', methods=['GET'])
+def get_latest_values():
+    # Current value of every sensor grouped per device, from memory
+    try:
+        microcontrolleur_ids = parse_int_list(request.args, 'microcontrolleur')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(latest_snapshot(current_app.config, set(microcontrolleur_ids) or None))
+
 @microcontrolleur_bp.route('/sensor-data', methods=['GET'])
 def get_sensor_data():
-    sensor_data = db.session.query(DonneeCapteur, Capteur, TypeCapteur, Microcontrolleur).\
-        join(Capteur, DonneeCapteur.capteurid == Capteur.id).\
-        join(TypeCapteur, Capteur.typecapteurid == TypeCapteur.id).\
-        join(Microcontrolleur, Capteur.microcontrolleurid == Microcontrolleur.id).\
-        order_by(DonneeCapteur.timestamp.desc()).all()
+    try:
+        filters = parse_sensor_filters(request.args)
+        limit = parse_limit(request.args, current_app.config['PAGE_SIZE_DEFAULT'], current_app.config['PAGE_SIZE_MAX'])
+        sensor_data, has_more = keyset_page(sensor_data_query(filters), DonneeCapteur.timestamp,
+                                            DonneeCapteur.id, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    last = sensor_data[-1].DonneeCapteur if sensor_data else None
     return jsonify({
-        'sensors': [{
-            'capteurid': data.DonneeCapteur.capteurid,
-            'type': data.TypeCapteur.nom,
-            'etat': data.Capteur.etat,
-            'valeur': data.DonneeCapteur.valeur,
-            'unite': data.TypeCapteur.unite,
-            'calibrated': True,
-            'timestamp': data.DonneeCapteur.timestamp.isoformat() + 'Z',
-            'microcontrolleur': data.Microcontrolleur.nom
-        } for data in sensor_data]
+        'sensors': [serialize_sensor_row(data) for data in sensor_data],
+        'next_cursor': encode_cursor(last.timestamp, last.id) if has_more else None
     })
 
 @microcontrolleur_bp.route('/device-metrics', methods=['POST'])
@@ -124,24 +141,13 @@ def add_device_metrics():
         return jsonify({'error': 'Missing microcontrolleurid or metrics'}), 400
 
     try:
-        timestamp = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-        for metric_name, value in data['metrics'].items():
-            # Find the sensor for this metric
-            sensor = Capteur.query.filter_by(
-                microcontrolleurid=data['microcontrolleurid'],
-                etat=metric_name
-            ).first()
-            if not sensor:
-                return jsonify({'error': f'No sensor found for metric {metric_name}'}), 400
-
-            # Add metric to donneescapteurs
-            donnee = DonneeCapteur(
-                capteurid=sensor.id,
-                valeur=float(value),
-                timestamp=timestamp
-            )
-            db.session.add(donnee)
+        timestamp = parse_timestamp(data['timestamp'])
+        sensors = resolve_sensors([data['microcontrolleurid']])
+        rows, errors = build_rows(sensors, data['microcontrolleurid'], timestamp, data['metrics'])
+        if errors:
+            return jsonify({'error': errors[0]['error']}), 400
 
+        insert_samples(rows)
         db.session.commit()
 
         # Trigger notification for each donneescapteur (handled by trigger)
@@ -150,9 +156,66 @@ def add_device_metrics():
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@microcontrolleur_bp.route('/device-metrics/bulk', methods=['POST'])
+def add_device_metrics_bulk():
+    data = request.get_json()
+    if not data or not isinstance(data.get('samples'), list):
+        return jsonify({'error': 'Missing samples'}), 400
+
+    # Validate every sample first so one bad entry doesn't abort the batch
+    errors = []
+    valid = []
+    for index, sample in enumerate(data['samples']):
+        try:
+            if not isinstance(sample.get('metrics'), dict):
+                raise ValueError('Missing microcontrolleurid or metrics')
+            valid.append((index, int(sample['microcontrolleurid']),
+                          parse_timestamp(sample['timestamp']), sample['metrics']))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            errors.append({'index': index, 'error': f'Invalid sample: {e}'})
+
+    try:
+        sensors = resolve_sensors(mc_id for _, mc_id, _, _ in valid)
+        rows = []
+        for index, mc_id, timestamp, metrics in valid:
+            sample_rows, sample_errors = build_rows(sensors, mc_id, timestamp, metrics)
+            rows.extend(sample_rows)
+            errors.extend(dict(error, index=index) for error in sample_errors)
+
+        inserted = len(insert_samples(rows))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    errors.sort(key=lambda error: error['index'])
+    status = 201 if not errors else (207 if inserted else 400)
+    return jsonify({'message': 'Device metrics added', 'inserted': inserted, 'errors': errors}), status
+
 @microcontrolleur_bp.route('/alerts', methods=['GET'])
 def get_alerts():
-    alerts = Alerte.query.order_by(Alerte.dateheure.desc()).all()
+    try:
+        since, until = parse_time_range(request.args)
+        capteurids = parse_int_list(request.args, 'capteurid')
+        statuts = parse_str_list(request.args, 'statut')
+        types = parse_str_list(request.args, 'type')
+        limit = parse_limit(request.args, current_app.config['PAGE_SIZE_DEFAULT'], current_app.config['PAGE_SIZE_MAX'])
+
+        query = Alerte.query
+        if since:
+            query = query.filter(Alerte.dateheure >= since)
+        if until:
+            query = query.filter(Alerte.dateheure < until)
+        if capteurids:
+            query = query.filter(Alerte.capteurid.in_(capteurids))
+        if statuts:
+            query = query.filter(Alerte.statut.in_(statuts))
+        if types:
+            query = query.filter(Alerte.type.in_(types))
+        alerts, has_more = keyset_page(query, Alerte.dateheure, Alerte.id, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     return jsonify({
         'alerts': [{
             'id': alert.id,
@@ -164,5 +227,6 @@ def get_alerts():
             'enseignantid': alert.enseignantid,
             'technicienid': alert.technicienid,
             'message': f"{alert.type}: {alert.statut.capitalize()}" + (f" (Sensor ID: {alert.capteurid})" if alert.capteurid else "")
-        } for alert in alerts]
-    })
\ No newline at end of file
+        } for alert in alerts],
+        'next_cursor': encode_cursor(alerts[-1].dateheure, alerts[-1].id) if has_more else None
+    })
@@ -0,0 +1,52 @@
+from flask import Blueprint, current_app, jsonify, request
+import numpy as np
+from ..utils.embeddings import embedding_index
+from ..utils.ingest import parse_timestamp
+from ..utils.timetable import resolve_events
+
+presence_bp = Blueprint('presence', __name__, url_prefix='/api')
+
+@presence_bp.route('/presences/match', methods=['POST'])
+def match_embeddings():
+    data = request.get_json()
+    if not data or not isinstance(data.get('embeddings'), list) or not data['embeddings']:
+        return jsonify({'error': 'Missing embeddings'}), 400
+    if len(data['embeddings']) > current_app.config['MATCH_MAX_PROBES']:
+        return jsonify({'error': f"At most {current_app.config['MATCH_MAX_PROBES']} embeddings per request"}), 400
+
+    try:
+        probes = np.asarray(data['embeddings'], dtype=np.float32)
+        if probes.ndim != 2:
+            raise ValueError('Embeddings must all have the same dimension')
+        k = min(int(data.get('k', 1)), current_app.config['MATCH_MAX_K'])
+        max_distance = float(data['max_distance']) if data.get('max_distance') is not None else None
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        embedding_index.ensure_loaded()
+        ids, distances = embedding_index.search(probes, k)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    matches = []
+    for probe_ids, probe_distances in zip(ids.tolist(), distances.tolist()):
+        matches.append([{'etudiantid': etudiant_id, 'distance': distance}
+                        for etudiant_id, distance in zip(probe_ids, probe_distances)
+                        if max_distance is None or distance <= max_distance])
+    return jsonify({'matches': matches, 'indexed': len(embedding_index)})
+
+@presence_bp.route('/presences/schedule', methods=['POST'])
+def resolve_schedule():
+    # Which course and teacher are running for each (student, time) event
+    data = request.get_json()
+    if not data or not isinstance(data.get('events'), list) or not data['events']:
+        return jsonify({'error': 'Missing events'}), 400
+    if len(data['events']) > current_app.config['TIMETABLE_MAX_EVENTS']:
+        return jsonify({'error': f"At most {current_app.config['TIMETABLE_MAX_EVENTS']} events per request"}), 400
+
+    try:
+        events = [(int(item['etudiantid']), parse_timestamp(item['date_heure'])) for item in data['events']]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each event needs an etudiantid and an ISO date_heure'}), 400
+
+    results = resolve_events(events, current_app.config['PRESENCE_LATE_MINUTES'])
+    return jsonify({'results': results})
@@ -0,0 +1,84 @@
+from flask import current_app, request
+from flask_socketio import emit, join_room, leave_room
+from ..utils.latest import latest_snapshot
+from ..utils.subscriptions import ALERTS_ROOM, BROADCAST_ROOM, rated_room, room_name
+
+# Subscription keys -> (room kind, value type)
+ROOM_KINDS = {'microcontrolleur': ('mc', int), 'type': ('type', str), 'classe': ('classe', int)}
+MAX_TYPE_LENGTH = 64
+
+
+def as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def check_value(key, value, value_type):
+    # bool is an int subclass; type names are bounded so room names stay short
+    if value_type is int and (not isinstance(value, int) or isinstance(value, bool)):
+        raise ValueError(f'{key} must be integer ids')
+    if value_type is str and (not isinstance(value, str) or not value or len(value) > MAX_TYPE_LENGTH):
+        raise ValueError(f'{key} must be names of at most {MAX_TYPE_LENGTH} characters')
+    return value
+
+
+def parse_subscription(data, allowed_rates, max_rooms):
+    # {'microcontrolleur': [1, 2], 'type': ['temperature'], 'classe': 3, 'alerts': true,
+    #  'all': false, 'rate_ms': 500} -> [(base room, rate_ms)]
+    if not isinstance(data, dict):
+        raise ValueError('Subscription must be an object')
+    rate_ms = int(data.get('rate_ms') or 0)
+    if rate_ms and rate_ms not in allowed_rates:
+        raise ValueError(f'rate_ms must be one of {sorted(allowed_rates)}')
+    entries = []
+    for key, (kind, value_type) in ROOM_KINDS.items():
+        for value in as_list(data.get(key)):
+            entry = (room_name(kind, check_value(key, value, value_type)), rate_ms)
+            if entry not in entries:
+                entries.append(entry)
+            if len(entries) > max_rooms:
+                raise ValueError(f'At most {max_rooms} rooms per subscription')
+    if data.get('alerts'):
+        entries.append((ALERTS_ROOM, 0))
+    if data.get('all'):
+        entries.append((BROADCAST_ROOM, 0))
+    if len(entries) > max_rooms:
+        raise ValueError(f'At most {max_rooms} rooms per subscription')
+    return entries
+
+
+def register_socket_events(socketio, subscriptions, allowed_rates, max_rooms):
+    def leave_all(sid):
+        leave_room(BROADCAST_ROOM)
+        for base, rate_ms in subscriptions.remove(sid):
+            leave_room(rated_room(base, rate_ms))
+
+    @socketio.on('connect')
+    def on_connect():
+        # Until a client subscribes it receives everything, like before rooms existed
+        join_room(BROADCAST_ROOM)
+        # Current value of every sensor, so dashboards can draw before the next frame
+        if current_app.config['SNAPSHOT_ON_CONNECT']:
+            emit('snapshot', {'type': 'snapshot', 'data': latest_snapshot(current_app.config)})
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        try:
+            entries = parse_subscription(data, allowed_rates, max_rooms)
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+        leave_all(request.sid)
+        for base, rate_ms in entries:
+            join_room(rated_room(base, rate_ms))
+        subscriptions.replace(request.sid, entries)
+        return {'rooms': [rated_room(base, rate_ms) for base, rate_ms in entries]}
+
+    @socketio.on('unsubscribe')
+    def on_unsubscribe(data=None):
+        leave_all(request.sid)
+        return {'rooms': []}
+
+    @socketio.on('disconnect')
+    def on_disconnect():
+        subscriptions.remove(request.sid)
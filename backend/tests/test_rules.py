@@ -0,0 +1,121 @@
+# backend/tests/test_rules.py
+from datetime import datetime, timedelta
+import pytest
+from ..utils.rules import (RingBuffer, RuleEngine, RateRule, Rule, SustainedRule, ThresholdRule,
+                           HeartbeatRule, build_rules, epoch)
+
+T0 = datetime(2024, 1, 1, 8, 0)
+
+
+def sample(capteur_id, valeur, seconds):
+    return {'capteurid': capteur_id, 'valeur': valeur, 'timestamp': T0 + timedelta(seconds=seconds)}
+
+
+def run(engine, rows):
+    # evaluate() followed by the commit of the ingest transaction
+    alerts, pending = engine.evaluate(rows)
+    engine.apply(pending, len(rows), len(alerts))
+    return [(alert['type'], alert['capteurid']) for alert in alerts]
+
+
+def test_ring_buffer_overwrites_oldest_when_full():
+    buffer = RingBuffer(3)
+    for t in range(5):
+        buffer.append(t, t * 10)
+    assert buffer.size == 3
+    assert buffer.oldest() == (2, 20)
+
+
+def test_ring_buffer_drop_before_wraps():
+    buffer = RingBuffer(3)
+    for t in range(5):
+        buffer.append(t, t)
+    buffer.drop_before(4)
+    assert buffer.size == 1
+    assert buffer.oldest() == (4, 4)
+    buffer.drop_before(10)
+    assert buffer.size == 0
+
+
+def test_ring_buffer_copy_is_independent():
+    buffer = RingBuffer(2)
+    buffer.append(1, 1)
+    clone = buffer.copy()
+    clone.append(2, 2)
+    assert buffer.size == 1 and clone.size == 2
+
+
+def test_rule_is_abstract():
+    with pytest.raises(TypeError):
+        Rule('r', 'm', 0)
+
+
+def test_sustained_rule_needs_the_whole_window():
+    rule = SustainedRule('hot', 'temp', 0, seconds=60, above=30)
+    state = rule.new_state()
+    assert not rule.check(state, 0, 35)
+    assert not rule.check(state, 30, 35)
+    assert rule.check(state, 60, 35)
+    # One sample back under the threshold restarts the window
+    assert not rule.check(state, 70, 25)
+    assert not rule.check(state, 80, 35)
+    assert rule.check(state, 140, 35)
+
+
+def test_rate_rule_compares_with_oldest_sample_in_window():
+    rule = RateRule('jump', 'temp', 0, max_rate=1, seconds=10)
+    state = rule.new_state()
+    assert not rule.check(state, 0, 0)
+    assert not rule.check(state, 5, 4)
+    assert rule.check(state, 8, 12)
+    # Samples older than the window are forgotten
+    assert not rule.check(state, 30, 13)
+
+
+def test_build_rules_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        build_rules([{'name': 'x', 'metric': 'm', 'kind': 'nope'}], 60)
+
+
+def test_engine_fires_once_per_breach_and_respects_cooldown():
+    engine = RuleEngine([ThresholdRule('hot', 'temp', 300, above=30)])
+    engine.register(1, 'temp')
+    assert run(engine, [sample(1, 35, 0), sample(1, 36, 10)]) == [('hot', 1)]
+    # Cleared then breached again inside the cooldown: no new alert
+    assert run(engine, [sample(1, 20, 20), sample(1, 35, 30)]) == []
+    assert run(engine, [sample(1, 20, 400), sample(1, 35, 410)]) == [('hot', 1)]
+    assert engine.stats()['fired'] == 2
+
+
+def test_engine_ignores_other_metrics_and_unknown_sensors():
+    engine = RuleEngine([ThresholdRule('hot', 'temp', 0, above=30)])
+    engine.register(1, 'humidity')
+    assert run(engine, [sample(1, 99, 0)]) == []
+
+
+def test_engine_state_waits_for_commit():
+    engine = RuleEngine([ThresholdRule('hot', 'temp', 300, above=30)])
+    engine.register(1, 'temp')
+    alerts, _ = engine.evaluate([sample(1, 35, 0)])
+    assert alerts
+    # The transaction rolled back: the same breach alerts again
+    assert run(engine, [sample(1, 35, 0)]) == [('hot', 1)]
+
+
+def test_engine_seeded_active_alert_is_not_raised_again():
+    engine = RuleEngine([ThresholdRule('hot', 'temp', 300, above=30)])
+    engine.register(1, 'temp', active={'hot': epoch(T0)})
+    assert run(engine, [sample(1, 35, 10)]) == []
+
+
+def test_sweep_skips_sensors_never_seen():
+    engine = RuleEngine([HeartbeatRule('silent', 'temp', 0, seconds=60)])
+    engine.register(1, 'temp')
+    engine.register(2, 'temp', last_seen=epoch(T0))
+    alerts, pending = engine.sweep(now=epoch(T0) + 100)
+    assert [alert['capteurid'] for alert in alerts] == [2]
+    engine.apply(pending)
+    assert engine.sweep(now=epoch(T0) + 200)[0] == []
+    # A new sample clears the alert
+    assert run(engine, [sample(2, 20, 300)]) == []
+    assert [alert['capteurid'] for alert in engine.sweep(now=epoch(T0) + 400)[0]] == [2]
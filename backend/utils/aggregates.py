@@ -0,0 +1,115 @@
+# backend/utils/aggregates.py
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import Interval, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from ..models.db import db, TypeCapteur, Capteur, DonneeCapteur
+from .sensor_query import apply_sensor_filters
+
+BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MIN_BUCKET = 1
+MAX_BUCKET = 86400
+# date_bin origin; buckets are aligned to whole seconds/minutes/hours/days from here
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+STREAM_CHUNK_SIZE = 50000
+
+
+def parse_bucket(value):
+    # '60', '30s', '5m', '1h', '1d' -> seconds
+    match = re.fullmatch(r'(\d+)([smhd]?)', (value or '').strip())
+    if not match:
+        raise ValueError('Invalid bucket')
+    seconds = int(match.group(1)) * BUCKET_UNITS[match.group(2) or 's']
+    if not MIN_BUCKET <= seconds <= MAX_BUCKET:
+        raise ValueError(f'bucket must be between {MIN_BUCKET}s and {MAX_BUCKET}s')
+    return seconds
+
+
+def require_selection(filters):
+    if not (filters['capteurid'] or filters['microcontrolleur'] or filters['etat']):
+        raise ValueError('Select sensors with capteurid, microcontrolleur or etat')
+    if not filters['since']:
+        raise ValueError('Missing since')
+
+
+def aggregate_raw(filters, bucket_seconds):
+    # min/max/avg/last/count per (capteurid, bucket), computed in PostgreSQL with date_bin
+    bucket = func.date_bin(literal(timedelta(seconds=bucket_seconds), Interval()),
+                           DonneeCapteur.timestamp, BUCKET_ORIGIN).label('bucket')
+    last = array_agg(aggregate_order_by(DonneeCapteur.valeur, DonneeCapteur.timestamp.desc()))[1]
+    query = db.session.query(
+        DonneeCapteur.capteurid,
+        bucket,
+        func.count(DonneeCapteur.id),
+        func.min(DonneeCapteur.valeur),
+        func.max(DonneeCapteur.valeur),
+        func.avg(DonneeCapteur.valeur),
+        last
+    ).join(Capteur, DonneeCapteur.capteurid == Capteur.id)
+    query = apply_sensor_filters(query, filters)
+    return query.group_by(DonneeCapteur.capteurid, bucket).\
+        order_by(DonneeCapteur.capteurid, bucket).all()
+
+
+def aggregate_rollup(model, filters, bucket_seconds):
+    # Same output shape as aggregate_raw, read from a rollup table
+    bucket = func.date_bin(literal(timedelta(seconds=bucket_seconds), Interval()),
+                           model.bucket, BUCKET_ORIGIN).label('bucket')
+    last = array_agg(aggregate_order_by(model.last, model.last_timestamp.desc()))[1]
+    query = db.session.query(
+        model.capteurid,
+        bucket,
+        func.sum(model.count),
+        func.min(model.min),
+        func.max(model.max),
+        func.sum(model.sum) / func.sum(model.count),
+        last
+    ).join(Capteur, model.capteurid == Capteur.id)
+    query = apply_sensor_filters(query, filters, model.bucket, model.capteurid)
+    return query.group_by(model.capteurid, bucket).order_by(model.capteurid, bucket).all()
+
+
+def rows_to_series(rows):
+    # (capteurid, bucket, count, min, max, avg, last) rows -> columnar series per sensor
+    series = {}
+    for capteurid, bucket, count, minimum, maximum, average, last in rows:
+        serie = series.get(capteurid)
+        if serie is None:
+            serie = series[capteurid] = {'t': [], 'count': [], 'min': [], 'max': [], 'avg': [], 'last': []}
+        serie['t'].append(bucket.isoformat() + 'Z')
+        serie['count'].append(count)
+        serie['min'].append(minimum)
+        serie['max'].append(maximum)
+        serie['avg'].append(float(average) if average is not None else None)
+        serie['last'].append(last)
+    return series
+
+
+def load_series_arrays(filters, capteurid):
+    # Streams (epoch, valeur) for one sensor in chunks into contiguous float64 arrays
+    query = select(func.extract('epoch', DonneeCapteur.timestamp), DonneeCapteur.valeur).\
+        join(Capteur, DonneeCapteur.capteurid == Capteur.id).\
+        where(DonneeCapteur.capteurid == capteurid)
+    filters = dict(filters, capteurid=[])
+    query = apply_sensor_filters(query, filters).order_by(DonneeCapteur.timestamp, DonneeCapteur.id)
+    result = db.session.execute(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+    chunks = [np.asarray(chunk, dtype=np.float64) for chunk in result.partitions()]
+    if not chunks:
+        return np.empty(0), np.empty(0)
+    data = np.concatenate(chunks)
+    return data[:, 0], data[:, 1]
+
+
+def selected_sensors(filters):
+    query = db.session.query(Capteur.id, Capteur.etat, Capteur.microcontrolleurid,
+                             TypeCapteur.nom, TypeCapteur.unite).\
+        join(TypeCapteur, Capteur.typecapteurid == TypeCapteur.id)
+    if filters['capteurid']:
+        query = query.filter(Capteur.id.in_(filters['capteurid']))
+    if filters['microcontrolleur']:
+        query = query.filter(Capteur.microcontrolleurid.in_(filters['microcontrolleur']))
+    if filters['etat']:
+        query = query.filter(Capteur.etat.in_(filters['etat']))
+    return {row[0]: {'capteurid': row[0], 'etat': row[1], 'microcontrolleurid': row[2],
+                     'type': row[3], 'unite': row[4]} for row in query.order_by(Capteur.id).all()}
@@ -0,0 +1,79 @@
+# backend/utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+from ..config import Config
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+# microcontrolleurid -> {etat: capteurid}
+sensor_cache = LRUCache(Config.SENSOR_CACHE_SIZE, Config.SENSOR_CACHE_TTL)
+# TypeCapteur.nom -> TypeCapteur.id
+type_cache = LRUCache(Config.TYPE_CACHE_SIZE, Config.SENSOR_CACHE_TTL)
+
+
+def invalidate_microcontrolleur(microcontrolleur_id):
+    sensor_cache.invalidate(int(microcontrolleur_id))
+
+
+def cache_stats():
+    return {'sensors': sensor_cache.stats(), 'types': type_cache.stats()}
@@ -0,0 +1,35 @@
+# backend/utils/downsample.py
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, per bucket,
+    # the point forming the largest triangle with the previous pick and the next bucket's mean.
+    # The loop runs once per output point; each step is vectorized over its bucket.
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return x, y
+
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    # Mean of every bucket, computed up front with cumulative sums
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    next_starts = edges[1:]
+    next_ends = np.append(edges[2:], length)
+    counts = next_ends - next_starts
+    mean_x = (cum_x[next_ends] - cum_x[next_starts]) / counts
+    mean_y = (cum_y[next_ends] - cum_y[next_starts]) / counts
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[previous] - mean_x[bucket]) * (by - y[previous]) -
+                      (x[previous] - bx) * (mean_y[bucket] - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return x[selected], y[selected]
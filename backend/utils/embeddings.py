@@ -0,0 +1,159 @@
+# backend/utils/embeddings.py
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..config import Config
+from ..models.db import db, Etudiant
+
+logger = logging.getLogger(__name__)
+
+
+def decode_embedding(raw):
+    # Etudiant.embedding stores the raw float32 vector
+    return np.frombuffer(raw, dtype=np.float32)
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class EmbeddingIndex:
+    # Every student's face embedding as one contiguous, L2-normalized float32 matrix.
+    # A batch of probes is matched with a single matrix multiply.
+    def __init__(self, reload_interval=300):
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = {}
+        self._size = 0
+        self._loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    @property
+    def dim(self):
+        return self._matrix.shape[1]
+
+    def __len__(self):
+        return self._size
+
+    def load(self):
+        rows = db.session.query(Etudiant.id, Etudiant.embedding).filter(Etudiant.embedding.isnot(None)).all()
+        vectors = [(etudiant_id, decode_embedding(raw)) for etudiant_id, raw in rows]
+        dims = {len(vector) for _, vector in vectors}
+        if len(dims) > 1:
+            # Keep the most common dimension; other rows can't be compared anyway
+            dim = max(dims, key=lambda d: sum(len(vector) == d for _, vector in vectors))
+            logger.warning(f"Ignoring {sum(len(v) != dim for _, v in vectors)} embeddings with a dimension other than {dim}")
+            vectors = [(etudiant_id, vector) for etudiant_id, vector in vectors if len(vector) == dim]
+        with self._lock:
+            if vectors:
+                self._matrix = normalize(np.stack([vector for _, vector in vectors]).astype(np.float32))
+                self._ids = np.array([etudiant_id for etudiant_id, _ in vectors], dtype=np.int64)
+            else:
+                self._matrix = np.empty((0, 0), dtype=np.float32)
+                self._ids = np.empty(0, dtype=np.int64)
+            self._size = len(vectors)
+            self._rows = {int(etudiant_id): row for row, etudiant_id in enumerate(self._ids)}
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded {self._size} face embeddings")
+
+    def ensure_loaded(self):
+        # Full reloads pick up changes made by other processes
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            self.load()
+
+    def upsert(self, etudiant_id, raw):
+        if raw is None:
+            return self.remove(etudiant_id)
+        vector = normalize(decode_embedding(raw).astype(np.float32))
+        with self._lock:
+            if self._size and len(vector) != self.dim:
+                logger.warning(f"Embedding of student {etudiant_id} has dimension {len(vector)}, expected {self.dim}")
+                return
+            row = self._rows.get(etudiant_id)
+            if row is None:
+                row = self._size
+                if row >= len(self._matrix) or not self._size:
+                    self._grow(len(vector))
+                self._rows[etudiant_id] = row
+                self._ids[row] = etudiant_id
+                self._size += 1
+            self._matrix[row] = vector
+
+    def _grow(self, dim):
+        capacity = max(16, 2 * len(self._matrix))
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def remove(self, etudiant_id):
+        with self._lock:
+            row = self._rows.pop(etudiant_id, None)
+            if row is None:
+                return
+            # Move the last row into the hole so the live rows stay contiguous
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._rows[int(self._ids[row])] = row
+            self._size = last
+
+    def search(self, probes, k=1):
+        # probes: (m, dim) array -> (ids, distances), both (m, k'), nearest first,
+        # cosine distance = 1 - cosine similarity
+        probes = normalize(np.asarray(probes, dtype=np.float32).reshape(len(probes), -1))
+        with self._lock:
+            if not self._size:
+                return np.empty((len(probes), 0), dtype=np.int64), np.empty((len(probes), 0), dtype=np.float32)
+            if probes.shape[1] != self.dim:
+                raise ValueError(f'Embeddings must have dimension {self.dim}')
+            similarities = probes @ self._matrix[:self._size].T
+            ids = self._ids[:self._size].copy()
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return ids[top], 1 - np.take_along_axis(top_similarities, order, axis=1)
+
+
+embedding_index = EmbeddingIndex(Config.EMBEDDING_INDEX_RELOAD)
+
+
+# Keep the index in sync with Etudiant rows written through this process: changes are
+# collected at flush time and applied only once the transaction commits
+@event.listens_for(Session, 'after_flush')
+def collect_embedding_changes(session, flush_context):
+    changes = session.info.setdefault('embedding_changes', {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Etudiant):
+            changes[obj.id] = obj.embedding
+    for obj in session.deleted:
+        if isinstance(obj, Etudiant):
+            changes[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_embedding_changes(session):
+    changes = session.info.pop('embedding_changes', None)
+    if changes and embedding_index.loaded:
+        for etudiant_id, raw in changes.items():
+            embedding_index.upsert(etudiant_id, raw)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_embedding_changes(session):
+    session.info.pop('embedding_changes', None)
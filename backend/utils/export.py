@@ -0,0 +1,75 @@
+# backend/utils/export.py
+import csv
+import io
+import json
+import zlib
+from ..models.db import Microcontrolleur, TypeCapteur, Capteur, DonneeCapteur
+from .sensor_query import sensor_data_query
+
+EXPORT_FIELDS = ['id', 'capteurid', 'type', 'etat', 'valeur', 'unite', 'timestamp', 'microcontrolleur']
+# Rows fetched per round trip on the server-side cursor, and rows per yielded chunk
+FETCH_SIZE = 10000
+WRITE_BATCH = 1000
+
+
+def export_query(filters):
+    # Oldest first; streamed through a named (server-side) cursor by yield_per
+    return sensor_data_query(filters).\
+        with_entities(DonneeCapteur.id, DonneeCapteur.capteurid, TypeCapteur.nom, Capteur.etat,
+                      DonneeCapteur.valeur, TypeCapteur.unite, DonneeCapteur.timestamp, Microcontrolleur.nom).\
+        order_by(DonneeCapteur.timestamp, DonneeCapteur.id).yield_per(FETCH_SIZE)
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(rows):
+    for batch in batched(rows, WRITE_BATCH):
+        yield ''.join(json.dumps({
+            'id': row[0],
+            'capteurid': row[1],
+            'type': row[2],
+            'etat': row[3],
+            'valeur': row[4],
+            'unite': row[5],
+            'timestamp': row[6].isoformat() + 'Z',
+            'microcontrolleur': row[7]
+        }) + '\n' for row in batch)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batched(rows, WRITE_BATCH):
+        writer.writerows(row[:6] + (row[6].isoformat() + 'Z', row[7]) for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(filters, fmt, compress=False):
+    rows = (tuple(row) for row in export_query(filters))
+    chunks = ndjson_chunks(rows) if fmt == 'ndjson' else csv_chunks(rows)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode() for chunk in chunks)
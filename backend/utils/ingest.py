@@ -0,0 +1,93 @@
+# backend/utils/ingest.py
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from ..models.db import db, Capteur, DonneeCapteur, TypeCapteur
+from .cache import sensor_cache, type_cache
+from .rollups import update_rollups
+from .latest import latest_store
+
+# Rows per multi-row INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def resolve_sensors(microcontrolleur_ids):
+    # {microcontrolleurid: {etat: capteurid}}, served from the cache when possible;
+    # boards missing from the cache are resolved together in one query
+    sensors = {}
+    missing = set()
+    for mc_id in {int(mc_id) for mc_id in microcontrolleur_ids}:
+        board = sensor_cache.get(mc_id)
+        if board is None:
+            missing.add(mc_id)
+        else:
+            sensors[mc_id] = board
+    if not missing:
+        return sensors
+    rows = db.session.query(Capteur.microcontrolleurid, Capteur.etat, Capteur.id).\
+        filter(Capteur.microcontrolleurid.in_(missing)).all()
+    loaded = {}
+    for mc_id, etat, capteur_id in rows:
+        loaded.setdefault(mc_id, {})[etat] = capteur_id
+    # Unknown boards are not cached so a later registration is seen immediately
+    for mc_id, board in loaded.items():
+        sensor_cache.set(mc_id, board)
+    sensors.update(loaded)
+    return sensors
+
+
+def resolve_type_ids(noms):
+    # TypeCapteur.nom -> id for the given names, one query for the cache misses
+    type_ids = {}
+    missing = set()
+    for nom in noms:
+        type_id = type_cache.get(nom)
+        if type_id is None:
+            missing.add(nom)
+        else:
+            type_ids[nom] = type_id
+    if missing:
+        rows = db.session.query(TypeCapteur.nom, db.func.min(TypeCapteur.id)).\
+            filter(TypeCapteur.nom.in_(missing)).group_by(TypeCapteur.nom).all()
+        for nom, type_id in rows:
+            type_cache.set(nom, type_id)
+            type_ids[nom] = type_id
+    return type_ids
+
+
+def insert_samples(rows):
+    # rows: list of {'capteurid', 'valeur', 'timestamp'} dicts; returns the new ids
+    ids = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        result = db.session.execute(insert(DonneeCapteur).values(rows[start:start + INSERT_CHUNK_SIZE]).
+                                    returning(DonneeCapteur.id))
+        ids.extend(result.scalars())
+    if rows and current_app.config['ROLLUPS_ENABLED']:
+        update_rollups(rows)
+    if rows and latest_store.loaded:
+        latest_store.stage_samples(db.session, rows)
+    return ids
+
+
+def build_rows(sensors, microcontrolleurid, timestamp, metrics):
+    # Returns (rows, errors); unknown metrics and bad values are reported, not raised
+    rows, errors = [], []
+    board = sensors.get(int(microcontrolleurid))
+    if board is None:
+        return rows, [{'error': f'Unknown microcontrolleur {microcontrolleurid}'}]
+    for metric_name, value in metrics.items():
+        capteur_id = board.get(metric_name)
+        if capteur_id is None:
+            errors.append({'metric': metric_name, 'error': f'No sensor found for metric {metric_name}'})
+            continue
+        try:
+            valeur = float(value)
+        except (TypeError, ValueError):
+            errors.append({'metric': metric_name, 'error': f'Invalid value for metric {metric_name}'})
+            continue
+        rows.append({'capteurid': capteur_id, 'valeur': valeur, 'timestamp': timestamp})
+    return rows, errors
@@ -0,0 +1,159 @@
+# backend/utils/latest.py
+import logging
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from ..models.db import db
+from .realtime import format_sensor_data
+from .timestamps import to_utc_naive, utc_now
+
+logger = logging.getLogger(__name__)
+
+# Newest sample of every sensor, in NEW_DATA_QUERY column order; only run at startup
+WARM_QUERY = """
+    SELECT DISTINCT ON (d.capteurid)
+           d.id, d.capteurid, d.valeur, d.timestamp,
+           c.etat, t.nom AS type, t.unite, m.nom AS microcontrolleur, m.id AS microcontrolleurid
+    FROM donneescapteurs d
+    JOIN capteurs c ON d.capteurid = c.id
+    JOIN typescapteurs t ON c.typecapteurid = t.id
+    JOIN microcontrolleur m ON c.microcontrolleurid = m.id
+    ORDER BY d.capteurid, d.timestamp DESC, d.id DESC
+"""
+
+SENSOR_INFO_QUERY = """
+    SELECT c.id, c.etat, t.nom AS type, t.unite, m.nom AS microcontrolleur, m.id AS microcontrolleurid
+    FROM capteurs c
+    JOIN typescapteurs t ON c.typecapteurid = t.id
+    JOIN microcontrolleur m ON c.microcontrolleurid = m.id
+    WHERE c.id = ANY(:ids)
+"""
+
+
+class LatestStore:
+    # Last value per capteurid, fed by ingest and the new_data listener, so device
+    # status views never read donneescapteurs. Entries are replaced, never mutated,
+    # and only by newer samples.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._info = {}
+        self._loaded = False
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return len(self._latest)
+
+    def _put(self, row):
+        # row: NEW_DATA_QUERY columns; caller holds the lock
+        capteur_id, timestamp = row[1], to_utc_naive(row[3])
+        current = self._latest.get(capteur_id)
+        if current is not None and current[0] >= timestamp:
+            return
+        self._info[capteur_id] = row[4:9]
+        self._latest[capteur_id] = (timestamp, row[8], format_sensor_data(row[:3] + (timestamp,) + row[4:9]))
+
+    def warm(self):
+        rows = db.session.execute(text(WARM_QUERY)).fetchall()
+        with self._lock:
+            for row in rows:
+                self._put(tuple(row))
+            self._loaded = True
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.warm()
+
+    def last_seen(self, capteur_id):
+        # Naive UTC timestamp of the newest known sample, or None
+        entry = self._latest.get(capteur_id)
+        return entry[0] if entry is not None else None
+
+    def update_rows(self, rows):
+        # Rows resolved by the notification listener (NEW_DATA_QUERY)
+        with self._lock:
+            for row in rows:
+                self._put(tuple(row))
+
+    def describe(self, samples):
+        # Looks up the sensors of these samples not described yet, in one query
+        with self._lock:
+            missing = {sample['capteurid'] for sample in samples} - self._info.keys()
+        if missing:
+            rows = db.session.execute(text(SENSOR_INFO_QUERY), {'ids': list(missing)}).fetchall()
+            with self._lock:
+                for row in rows:
+                    self._info[row[0]] = tuple(row[1:])
+
+    def stage_samples(self, session, samples):
+        # {'capteurid', 'valeur', 'timestamp'} dicts from ingest; they become visible
+        # once the transaction inserting them commits
+        self.describe(samples)
+        session.info.setdefault('latest_samples', []).extend(samples)
+
+    def update_samples(self, samples):
+        with self._lock:
+            for sample in samples:
+                info = self._info.get(sample['capteurid'])
+                if info is not None:
+                    self._put((None, sample['capteurid'], sample['valeur'], sample['timestamp']) + info)
+
+    def snapshot(self, microcontrolleur_ids=None, stale_after=300, offline_after=120):
+        # One entry per device: its sensors' last values, last_seen and an online flag
+        now = utc_now()
+        with self._lock:
+            entries = list(self._latest.values())
+        devices = {}
+        for timestamp, mc_id, data in entries:
+            if microcontrolleur_ids is not None and mc_id not in microcontrolleur_ids:
+                continue
+            device = devices.get(mc_id)
+            if device is None:
+                device = devices[mc_id] = {'microcontrolleurid': mc_id, 'microcontrolleur': data['microcontrolleur'],
+                                           'last_seen': timestamp, 'sensors': []}
+            device['last_seen'] = max(device['last_seen'], timestamp)
+            device['sensors'].append(dict(data, stale=(now - timestamp).total_seconds() > stale_after))
+        result = []
+        for mc_id in sorted(devices):
+            device = devices[mc_id]
+            device['online'] = (now - device['last_seen']).total_seconds() <= offline_after
+            device['last_seen'] = device['last_seen'].isoformat() + 'Z'
+            device['sensors'].sort(key=lambda data: data['capteurid'])
+            result.append(device)
+        return {'generated_at': now.isoformat() + 'Z', 'devices': result}
+
+
+latest_store = LatestStore()
+
+
+def latest_snapshot(config, microcontrolleur_ids=None):
+    latest_store.ensure_loaded()
+    return latest_store.snapshot(microcontrolleur_ids, config['SENSOR_STALE_SECONDS'],
+                                 config['DEVICE_OFFLINE_SECONDS'])
+
+
+def warm_latest_store(app):
+    # Started in the background by app.py; on failure the first reader warms it instead
+    with app.app_context():
+        try:
+            latest_store.warm()
+            logger.info(f"Loaded the latest value of {len(latest_store)} sensors")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error warming the latest-value store: {str(e)}")
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_latest_samples(session):
+    samples = session.info.pop('latest_samples', None)
+    if samples:
+        latest_store.update_samples(samples)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_latest_samples(session):
+    session.info.pop('latest_samples', None)
@@ -0,0 +1,200 @@
+# backend/utils/metrics.py
+import bisect
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.register(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{format_labels(self.labelnames, labels)} {value}'
+                                for labels, value in items]
+
+
+class CounterTotal(Counter):
+    # A counter whose total is kept by another component and copied at scrape time
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{format_labels(self.labelnames, labels)} {value}'
+                                for labels, value in items]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def add_collector(self, collector):
+        # Called at scrape time to refresh gauges that mirror other components' state
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Request latency per route',
+                         ('endpoint', 'method', 'status'))
+HTTP_SQL_QUERIES = Histogram('http_request_sql_queries', 'SQL statements per request',
+                             ('endpoint',), COUNT_BUCKETS)
+HTTP_SQL_SECONDS = Histogram('http_request_sql_seconds', 'Time spent in SQL per request', ('endpoint',))
+SQL_QUERIES = Counter('sql_queries_total', 'SQL statements executed')
+SQL_SECONDS = Counter('sql_seconds_total', 'Time spent executing SQL statements')
+SOCKETIO_EMITS = Counter('socketio_emits_total', 'Socket.IO emits per event', ('event',))
+NOTIFY_TO_EMIT = Histogram('listener_notify_to_emit_seconds', 'Time from NOTIFY receipt to emit', ('channel',))
+LISTENER_QUEUE_DEPTH = Gauge('listener_queue_depth', 'Notifications waiting for the emitter')
+LISTENER_DROPPED = CounterTotal('listener_dropped_total', 'Notifications dropped by the bounded queue', ('channel',))
+LISTENER_RECONNECTS = CounterTotal('listener_reconnects_total', 'Listener and emitter reconnections')
+LISTENER_LEADER = Gauge('listener_leader', 'Whether this worker runs the notification listener')
+CACHE_EVENTS = CounterTotal('cache_events_total', 'Lookup cache hits, misses and evictions', ('cache', 'event'))
+CACHE_SIZE = Gauge('cache_size', 'Entries in the lookup caches', ('cache',))
+
+
+def init_app(app):
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+            HTTP_SQL_QUERIES.observe(g.sql_queries, endpoint)
+            HTTP_SQL_SECONDS.observe(g.sql_seconds, endpoint)
+        return response
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def sql_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+    SQL_QUERIES.inc()
+    SQL_SECONDS.inc(elapsed)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def sql_failed(context):
+    # after_cursor_execute doesn't fire for failed statements
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def listener_collector(listener):
+    def collect():
+        stats = listener.stats()
+        LISTENER_QUEUE_DEPTH.set(stats['queue_depth'])
+        LISTENER_RECONNECTS.set(stats['reconnects'])
+        LISTENER_LEADER.set(int(stats['leader']))
+        for channel, dropped in stats['dropped'].items():
+            LISTENER_DROPPED.set(dropped, channel)
+    return collect
+
+
+def cache_collector(stats_function):
+    def collect():
+        for cache, stats in stats_function().items():
+            CACHE_SIZE.set(stats['size'], cache)
+            for name in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+                CACHE_EVENTS.set(stats[name], cache, name)
+    return collect
@@ -0,0 +1,66 @@
+# backend/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+from .ingest import parse_timestamp
+from .timestamps import to_utc_naive
+
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+
+def parse_limit(args, default, maximum):
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    return min(limit, maximum)
+
+
+def parse_int_list(args, name):
+    # Accepts ?name=1,2 as well as repeated ?name=1&name=2
+    values = []
+    for raw in args.getlist(name):
+        for part in raw.split(','):
+            if part.strip():
+                try:
+                    values.append(int(part))
+                except ValueError:
+                    raise ValueError(f'Invalid {name}')
+    return values
+
+
+def parse_str_list(args, name):
+    return [part.strip() for raw in args.getlist(name) for part in raw.split(',') if part.strip()]
+
+
+def parse_time_range(args):
+    try:
+        since = parse_timestamp(args['since']) if args.get('since') else None
+        until = parse_timestamp(args['until']) if args.get('until') else None
+    except ValueError:
+        raise ValueError('Invalid since or until')
+    return to_utc_naive(since), to_utc_naive(until)
+
+
+def keyset_page(query, timestamp_column, id_column, cursor, limit):
+    # Newest first; the cursor is the (timestamp, id) of the last row of the previous page
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
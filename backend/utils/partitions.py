@@ -0,0 +1,155 @@
+# backend/utils/partitions.py
+import logging
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy.sql import text
+from ..models.db import db
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'donneescapteurs'
+DEFAULT_PARTITION = 'donneescapteurs_default'
+EXPORT_CHUNK_SIZE = 100000
+# The historical partition of migrations/003 starts at MINVALUE
+BOUND_PATTERN = re.compile(r"FROM \((MINVALUE|'[^']+')\) TO \('([^']+)'\)")
+
+
+def is_partitioned():
+    return db.session.execute(text("""
+        SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:parent)
+    """), {'parent': PARENT_TABLE}).scalar() or False
+
+
+def ensure_partitions(days_ahead, step='day'):
+    # Creates any missing partitions from yesterday up to `days_ahead` days from now, and
+    # further back for days whose rows landed in the DEFAULT partition (maintenance not
+    # running for a while) as long as they are newer than the oldest range partition;
+    # the function moves those rows into the new partitions (migrations/005). Days
+    # covered by the historical partition of migrations/003 are skipped.
+    first_day = date.today() - timedelta(days=1)
+    stranded = db.session.execute(text(f'SELECT min(timestamp) FROM "{DEFAULT_PARTITION}"')).scalar()
+    partitions = list_partitions()
+    if stranded is not None and partitions:
+        first_day = min(first_day, max(stranded.date(), partitions[0][1].date()))
+    if partitions and partitions[0][1] == datetime.min:
+        first_day = max(first_day, partitions[0][2].date())
+    created = db.session.execute(
+        text("SELECT ensure_donneescapteurs_partitions(:first_day, current_date + :ahead, :step)"),
+        {'first_day': first_day, 'ahead': days_ahead, 'step': step}
+    ).scalar()
+    db.session.commit()
+    return created
+
+
+def list_partitions():
+    # [(name, lower, upper)] for every range partition, oldest first (the DEFAULT one is skipped)
+    rows = db.session.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {'parent': PARENT_TABLE}).all()
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound or '')
+        if match:
+            lower = datetime.min if match.group(1) == 'MINVALUE' else datetime.fromisoformat(match.group(1).strip("'"))
+            partitions.append((name, lower, datetime.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def retention_cutoff(retention_days, today=None):
+    return datetime.combine((today or date.today()) - timedelta(days=retention_days), datetime.min.time())
+
+
+def expired_partitions(retention_days, today=None):
+    cutoff = retention_cutoff(retention_days, today)
+    return [partition for partition in list_partitions() if partition[2] <= cutoff]
+
+
+def export_partition(name, export_dir, before=None, filename=None):
+    # Streams one partition (only its rows older than `before` when given) into a
+    # zstd-compressed Parquet file; pyarrow is optional
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Exporting partitions requires pyarrow (pip install pyarrow)')
+
+    schema = pa.schema([('id', pa.int32()), ('capteurid', pa.int32()),
+                        ('valeur', pa.float64()), ('timestamp', pa.timestamp('us'))])
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f'{filename or name}.parquet')
+    tmp_path = path + '.tmp'
+    where = 'WHERE timestamp < :before' if before is not None else ''
+    result = db.session.execute(
+        text(f'SELECT id, capteurid, valeur, timestamp FROM "{name}" {where} ORDER BY timestamp, id').
+        execution_options(yield_per=EXPORT_CHUNK_SIZE),
+        {'before': before} if before is not None else {}
+    )
+    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        for chunk in result.partitions():
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+    os.replace(tmp_path, path)
+    return path
+
+
+def drop_partition(name):
+    db.session.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+    db.session.execute(text(f'DROP TABLE "{name}"'))
+    db.session.commit()
+
+
+def apply_retention(retention_days, export_dir=None):
+    # Drops whole expired partitions instead of DELETEing rows; rollups keep the history
+    dropped = []
+    for name, _, _ in expired_partitions(retention_days):
+        if export_dir:
+            path = export_partition(name, export_dir)
+            logger.info(f"Exported partition {name} to {path}")
+        drop_partition(name)
+        logger.info(f"Dropped expired partition {name}")
+        dropped.append(name)
+
+    # Rows stranded in the DEFAULT partition (older than every range partition) expire too
+    cutoff = retention_cutoff(retention_days)
+    if db.session.execute(text(f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE timestamp < :cutoff LIMIT 1'),
+                          {'cutoff': cutoff}).first():
+        if export_dir:
+            path = export_partition(DEFAULT_PARTITION, export_dir, before=cutoff,
+                                    filename=f'{DEFAULT_PARTITION}_{cutoff:%Y%m%d}')
+            logger.info(f"Exported expired rows of {DEFAULT_PARTITION} to {path}")
+        db.session.execute(text(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE timestamp < :cutoff'), {'cutoff': cutoff})
+        db.session.commit()
+        dropped.append(DEFAULT_PARTITION)
+    return dropped
+
+
+def maintain_partitions(config):
+    # A no-op until migrations/003 has turned donneescapteurs into a partitioned table
+    if not is_partitioned():
+        db.session.rollback()
+        return 0, []
+    created = ensure_partitions(config['PARTITION_PRECREATE_DAYS'], config['PARTITION_INTERVAL'])
+    dropped = []
+    if config['PARTITION_RETENTION_DAYS']:
+        dropped = apply_retention(config['PARTITION_RETENTION_DAYS'], config['PARTITION_EXPORT_DIR'])
+    return created, dropped
+
+
+def run_maintenance_forever(app):
+    # Background loop started by app.py unless PARTITIONING_ENABLED is turned off
+    while True:
+        with app.app_context():
+            try:
+                created, dropped = maintain_partitions(app.config)
+                if created or dropped:
+                    logger.info(f"Partition maintenance: {created} created, {len(dropped)} dropped")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error in partition maintenance: {str(e)}")
+        time.sleep(app.config['PARTITION_MAINTENANCE_INTERVAL'])
@@ -0,0 +1,82 @@
+# backend/utils/profiler.py
+import gc
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import greenlet
+    from eventlet import patcher, sleep as cooperative_sleep
+    # The sampler needs an OS thread and a blocking sleep even when the server
+    # monkey-patches threading and time
+    real_threading = patcher.original('threading')
+    real_time = patcher.original('time')
+except ImportError:
+    greenlet = None
+    cooperative_sleep = time.sleep
+    real_threading = threading
+    real_time = time
+
+# How often the list of suspended greenlets is refreshed (it is a gc scan)
+GREENLET_SCAN_INTERVAL = 1.0
+
+
+def format_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def suspended_greenlets():
+    if greenlet is None:
+        return []
+    return [obj for obj in gc.get_objects() if isinstance(obj, greenlet.greenlet) and obj.gr_frame is not None]
+
+
+class SamplingProfiler:
+    # Samples every thread's Python stack at a fixed interval and aggregates them as
+    # collapsed stacks ("a;b;c count"), the input format of flame graph tools. Under
+    # eventlet, request greenlets all run on the hub thread: the running one shows in
+    # that thread's stack and suspended ones are sampled under a 'greenlet' root.
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def sample(self, seconds, stacks):
+        own = real_threading.get_ident()
+        greenlets, scanned_at = [], None
+        deadline = real_time.monotonic() + seconds
+        while real_time.monotonic() < deadline:
+            if scanned_at is None or real_time.monotonic() - scanned_at > GREENLET_SCAN_INTERVAL:
+                greenlets, scanned_at = suspended_greenlets(), real_time.monotonic()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    stacks[format_stack(frame)] += 1
+            for green in greenlets:
+                frame = green.gr_frame
+                if frame is not None:
+                    stacks['greenlet;' + format_stack(frame)] += 1
+            real_time.sleep(self.interval)
+
+    def profile(self, seconds):
+        # One profiling session at a time. Sampling runs in its own OS thread; the caller
+        # waits with a cooperative sleep so the eventlet hub keeps serving clients.
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError('A profile is already running')
+        try:
+            stacks = Counter()
+            sampler = real_threading.Thread(target=self.sample, args=(seconds, stacks), daemon=True)
+            sampler.start()
+            while sampler.is_alive():
+                cooperative_sleep(min(self.interval * 10, 0.1))
+            return stacks
+        finally:
+            self._lock.release()
+
+
+def collapsed(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
@@ -0,0 +1,153 @@
+# backend/utils/pubsub.py
+import json
+import queue
+import select
+import threading
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from socketio import PubSubManager
+from .realtime import backoff_delay, uri_to_dsn
+
+# NOTIFY payloads are limited to 8000 bytes; larger messages are spilled to a table
+MAX_NOTIFY_PAYLOAD = 7000
+SPILL_RETENTION = '5 minutes'
+SPILL_CLEANUP_EVERY = 500
+
+
+class PostgresManager(PubSubManager):
+    # Socket.IO client manager that fans emits out to every worker through
+    # PostgreSQL LISTEN/NOTIFY (see migrations/004 for the spill table)
+    name = 'postgresql'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.dsn = uri_to_dsn(url)
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._spilled = 0
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30,
+                                keepalives_interval=10, keepalives_count=3)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cursor:
+                        if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+                            cursor.execute("INSERT INTO socketio_messages (payload) VALUES (%s) RETURNING id",
+                                           (payload,))
+                            payload = f"#{cursor.fetchone()[0]}"
+                            self._spilled += 1
+                            if self._spilled % SPILL_CLEANUP_EVERY == 0:
+                                cursor.execute("DELETE FROM socketio_messages WHERE created_at < now() - %s::interval",
+                                               (SPILL_RETENTION,))
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except psycopg2.OperationalError:
+                    # Stale connection: reconnect once, then let the error surface
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        attempt = 0
+        while True:
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}";')
+                attempt = 0
+                while True:
+                    self._wait_readable(conn, 60)
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        if payload.startswith('#'):
+                            with conn.cursor() as cursor:
+                                cursor.execute("SELECT payload FROM socketio_messages WHERE id = %s",
+                                               (int(payload[1:]),))
+                                row = cursor.fetchone()
+                            if row is None:
+                                continue
+                            payload = row[0]
+                        yield payload
+            except psycopg2.Error as e:
+                self._get_logger().error(f"PostgreSQL pubsub connection lost: {str(e)}")
+                attempt += 1
+                self.server.sleep(backoff_delay(attempt, 30))
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _wait_readable(self, conn, timeout):
+        # This runs as a Socket.IO background task: yield to the eventlet hub
+        # instead of blocking it when the server runs on eventlet
+        if self.server.async_mode == 'eventlet':
+            from eventlet.hubs import trampoline
+            try:
+                trampoline(conn, read=True, timeout=timeout, timeout_exc=TimeoutError)
+            except TimeoutError:
+                pass
+        else:
+            select.select([conn], [], [], timeout)
+
+
+class LocalBus:
+    # In-process stand-in for a broker: every subscriber queue receives every message
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, channel):
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(subscriber)
+        return subscriber
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+
+local_bus = LocalBus()
+
+
+class LocalManager(PubSubManager):
+    # Fans out between Socket.IO servers living in the same process (tests, benchmarks)
+    name = 'local'
+
+    def __init__(self, url='local://', channel='socketio', write_only=False, logger=None, bus=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus or local_bus
+        self._subscriber = None if write_only else self.bus.subscribe(channel)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, json.dumps(data))
+
+    def _listen(self):
+        while True:
+            yield self._subscriber.get()
+
+
+def socketio_options(config):
+    # Extra SocketIO() arguments for the configured message queue:
+    # None (single process), 'postgresql://...', 'local://', or any URL python-socketio supports natively
+    url = config['SOCKETIO_MESSAGE_QUEUE']
+    if not url:
+        return {}
+    channel = config['SOCKETIO_CHANNEL']
+    if url.startswith(('postgresql://', 'postgresql+psycopg2://', 'postgres://')):
+        return {'client_manager': PostgresManager(url, channel=channel)}
+    if url.startswith('local://'):
+        return {'client_manager': LocalManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
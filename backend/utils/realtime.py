@@ -0,0 +1,448 @@
+# backend/utils/realtime.py
+import json
+import logging
+import os
+import random
+import select
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlparse
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from .cache import invalidate_microcontrolleur
+from .metrics import NOTIFY_TO_EMIT, SOCKETIO_EMITS
+from .subscriptions import ALERTS_ROOM, BROADCAST_ROOM, RoomThrottle, Subscriptions, room_name
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ['new_microcontrolleur', 'new_data', 'new_alert', 'new_presence']
+
+# Rooms joined in any worker that published its subscriptions recently
+SUBSCRIBED_ROOMS_QUERY = """
+    SELECT DISTINCT room, rate_ms FROM socketio_subscriptions
+    WHERE updated_at > now() - %s * interval '1 second'
+"""
+
+NEW_DATA_QUERY = """
+    SELECT d.id, d.capteurid, d.valeur, d.timestamp,
+           c.etat, t.nom AS type, t.unite, m.nom AS microcontrolleur, m.id AS microcontrolleurid
+    FROM donneescapteurs d
+    JOIN capteurs c ON d.capteurid = c.id
+    JOIN typescapteurs t ON c.typecapteurid = t.id
+    JOIN microcontrolleur m ON c.microcontrolleurid = m.id
+    WHERE d.id = ANY(%s) AND d.timestamp BETWEEN %s AND %s
+    ORDER BY d.timestamp, d.id
+"""
+
+
+def new_data_lookup(payloads):
+    # (ids, min timestamp, max timestamp) for NEW_DATA_QUERY; the timestamp bounds let
+    # PostgreSQL prune donneescapteurs partitions. Payloads from a trigger older than
+    # migrations/007 carry no timestamp and fall back to every partition.
+    ids = [payload['id'] for payload in payloads]
+    stamps = [payload.get('timestamp') for payload in payloads]
+    if None in stamps:
+        return ids, '-infinity', 'infinity'
+    stamps = [datetime.fromisoformat(stamp) for stamp in stamps]
+    return ids, min(stamps), max(stamps)
+
+
+# Function to convert SQLAlchemy URI to psycopg2 DSN
+def uri_to_dsn(uri):
+    parsed = urlparse(uri)
+    dbname = parsed.path.lstrip('/')
+    user = parsed.username
+    password = parsed.password
+    host = parsed.hostname
+    port = parsed.port
+    return f"dbname={dbname} user={user} password={password} host={host} port={port}"
+
+
+def format_sensor_data(row):
+    return {
+        'capteurid': row[1],
+        'type': row[5],
+        'etat': row[4],
+        'valeur': row[2],
+        'unite': row[6],
+        'calibrated': True,
+        'timestamp': row[3].isoformat() + 'Z',
+        'microcontrolleur': row[7]
+    }
+
+
+def format_alert(payload):
+    message = f"{payload['type']}: {payload['statut'].capitalize()}"
+    if payload['capteurid']:
+        message += f" (Sensor ID: {payload['capteurid']})"
+    return {
+        'id': payload['id'],
+        'type': payload['type'],
+        'dateheure': payload['dateheure'],
+        'statut': payload['statut'],
+        'etudiantid': payload['etudiantid'],
+        'capteurid': payload['capteurid'],
+        'enseignantid': payload['enseignantid'],
+        'technicienid': payload['technicienid'],
+        'message': message
+    }
+
+
+def format_presence(payload):
+    return {
+        'id': payload['id'],
+        'etudiantid': payload['etudiantid'],
+        'statut': payload['statut'],
+        'date_heure': payload['date_heure']
+    }
+
+
+class NotificationQueue:
+    # Bounded buffer between the LISTEN connection and the Socket.IO emitter.
+    # When full, new_data notifications are shed first (oldest or newest per policy);
+    # alerts, presences and registrations only evict new_data entries.
+    def __init__(self, maxsize=10000, policy='drop_oldest'):
+        if policy not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unknown queue policy {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = {channel: 0 for channel in CHANNELS}
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, channel, payload):
+        with self._cond:
+            if len(self._items) >= self.maxsize and not self._make_room(channel):
+                self.dropped[channel] += 1
+                return False
+            self._items.append((channel, payload, time.monotonic()))
+            self._cond.notify()
+            return True
+
+    def _make_room(self, channel):
+        if channel == 'new_data' and self.policy == 'drop_newest':
+            return False
+        indexes = range(len(self._items))
+        if self.policy == 'drop_newest':
+            indexes = reversed(indexes)
+        for index in indexes:
+            if self._items[index][0] == 'new_data':
+                del self._items[index]
+                self.dropped['new_data'] += 1
+                return True
+        return False
+
+    def get_batch(self, timeout, max_items):
+        # Wait up to `timeout` for the first item, then take everything queued
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            batch = []
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft())
+            return batch
+
+
+class NotificationListener:
+    # A reader thread blocks on the LISTEN socket and feeds a bounded queue; an emitter
+    # thread coalesces new_data ids, resolves them with one query per flush interval and
+    # emits one frame per microcontroller. Both reconnect forever with jittered backoff.
+    def __init__(self, socketio, dsn, flush_interval=0.1, legacy_events=False,
+                 queue_size=10000, queue_policy='drop_oldest', max_backoff=30,
+                 leader_lock_key=None, leader_retry=5, shared_subscriptions=False,
+                 subscription_sync=1.0, subscription_ttl=30):
+        self.socketio = socketio
+        self.dsn = dsn
+        self.flush_interval = flush_interval
+        self.legacy_events = legacy_events
+        self.max_backoff = max_backoff
+        self.queue = NotificationQueue(queue_size, queue_policy)
+        self.leader_lock_key = leader_lock_key
+        self.leader_retry = leader_retry
+        self.is_leader = False
+        self.subscriptions = Subscriptions()
+        # With several workers, room counts are exchanged through socketio_subscriptions
+        self.shared_subscriptions = shared_subscriptions
+        self.subscription_sync = subscription_sync
+        self.subscription_ttl = subscription_ttl
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.throttle = RoomThrottle()
+        self.reconnects = 0
+        self.threads = []
+        # Callables receiving every resolved new_data row batch (NEW_DATA_QUERY rows);
+        # leader_row_hooks only run on the elected listener
+        self.row_hooks = []
+        self.leader_row_hooks = []
+
+    def connect(self, listen=True):
+        conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30,
+                                keepalives_interval=10, keepalives_count=3)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        if listen:
+            with conn.cursor() as cursor:
+                for channel in CHANNELS:
+                    cursor.execute(f"LISTEN {channel};")
+        return conn
+
+    def start(self):
+        targets = [self.read_forever, self.emit_forever]
+        if self.shared_subscriptions:
+            targets.append(self.sync_forever)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def run_forever(self, step, name):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Error in notification {name}: {str(e)}")
+            # A connection that stayed up for a while resets the backoff
+            attempt = 0 if time.monotonic() - started > self.max_backoff else attempt + 1
+            self.reconnects += 1
+            time.sleep(backoff_delay(attempt, self.max_backoff))
+
+    def read_forever(self):
+        self.run_forever(self.read, 'listener')
+
+    def emit_forever(self):
+        self.run_forever(self.emit, 'emitter')
+
+    def sync_forever(self):
+        self.run_forever(self.sync, 'subscription sync')
+
+    def read(self):
+        conn = self.connect(listen=False)
+        try:
+            self.wait_for_leadership(conn)
+            with conn.cursor() as cursor:
+                for channel in CHANNELS:
+                    cursor.execute(f"LISTEN {channel};")
+            self.is_leader = True
+            logger.info("Listening for PostgreSQL notifications...")
+            while True:
+                # Sleeps in the kernel (or the eventlet hub when monkey-patched) until data arrives
+                readable, _, _ = select.select([conn], [], [], 60)
+                if not readable:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.queue.put(notify.channel, notify.payload)
+        finally:
+            self.is_leader = False
+            conn.close()
+
+    def wait_for_leadership(self, conn):
+        # With several workers only the holder of a session advisory lock listens and
+        # emits (through the message queue). The lock dies with its connection, so a
+        # standby takes over within leader_retry seconds when the leader goes away.
+        # Standbys still LISTEN to registrations to keep their sensor cache fresh, and
+        # to new data so the row hooks (latest values) see every board.
+        if self.leader_lock_key is None:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute("LISTEN new_microcontrolleur;")
+            cursor.execute("LISTEN new_data;")
+            retry_at = 0
+            while True:
+                if time.monotonic() >= retry_at:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.leader_lock_key,))
+                    if cursor.fetchone()[0]:
+                        logger.info("Elected as notification listener")
+                        return
+                    retry_at = time.monotonic() + self.leader_retry
+                readable, _, _ = select.select([conn], [], [], max(0, retry_at - time.monotonic()))
+                if not readable:
+                    continue
+                # Let a burst accumulate for one flush interval before resolving it
+                time.sleep(self.flush_interval)
+                conn.poll()
+                new_data = []
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    payload = json.loads(notify.payload)
+                    if notify.channel == 'new_data':
+                        new_data.append(payload)
+                    else:
+                        invalidate_microcontrolleur(payload['id'])
+                if new_data:
+                    self.resolve(conn, new_data)
+
+    def sync(self):
+        # Publishes this worker's room counts whenever they change (and as a heartbeat
+        # every third of the TTL); the elected worker reads everyone's rooms back each
+        # interval so it only emits to rooms someone joined, in any worker
+        conn = self.connect(listen=False)
+        try:
+            published_at = 0
+            while True:
+                changed = self.subscriptions.changed.wait(self.subscription_sync)
+                self.subscriptions.changed.clear()
+                if changed or time.monotonic() - published_at > self.subscription_ttl / 3:
+                    self.publish_subscriptions(conn)
+                    published_at = time.monotonic()
+                if self.is_leader:
+                    with conn.cursor() as cursor:
+                        cursor.execute(SUBSCRIBED_ROOMS_QUERY, (self.subscription_ttl,))
+                        self.subscriptions.set_remote(cursor.fetchall())
+        finally:
+            conn.close()
+
+    def publish_subscriptions(self, conn):
+        counts = self.subscriptions.counts()
+        with conn.cursor() as cursor:
+            cursor.execute("BEGIN")
+            cursor.execute("DELETE FROM socketio_subscriptions WHERE worker = %s "
+                           "OR updated_at < now() - 10 * %s * interval '1 second'",
+                           (self.worker_id, self.subscription_ttl))
+            if counts:
+                cursor.execute("INSERT INTO socketio_subscriptions (worker, room, rate_ms, clients) "
+                               "SELECT %s, * FROM unnest(%s::text[], %s::integer[], %s::integer[])",
+                               (self.worker_id, [room for room, _, _ in counts],
+                                [rate_ms for _, rate_ms, _ in counts], [count for _, _, count in counts]))
+            cursor.execute("COMMIT")
+
+    def emit(self):
+        conn = self.connect(listen=False)
+        try:
+            while True:
+                # Wake up in time for rate-limited rooms that have values waiting
+                timeout = self.flush_interval if self.throttle.has_pending() else 60
+                batch = self.queue.get_batch(timeout=timeout, max_items=self.queue.maxsize)
+                if batch:
+                    # Let a burst accumulate for one flush interval before resolving it
+                    time.sleep(self.flush_interval)
+                    batch.extend(self.queue.get_batch(timeout=0, max_items=self.queue.maxsize))
+                    self.dispatch(conn, batch)
+                for room, rows in self.throttle.due():
+                    self.send('new_data', {'type': 'new_data_batch', 'data': rows}, to=room)
+        finally:
+            conn.close()
+
+    def send(self, event, data, to=None):
+        self.socketio.emit(event, data, to=to)
+        SOCKETIO_EMITS.inc(1, event)
+
+    def dispatch(self, conn, batch):
+        new_data, alerts, presences = [], [], []
+        for channel, raw_payload, _ in batch:
+            payload = json.loads(raw_payload)
+            if channel == 'new_data':
+                new_data.append(payload)
+            elif channel == 'new_microcontrolleur':
+                # Keep this worker's sensor cache consistent with registrations from any worker
+                invalidate_microcontrolleur(payload['id'])
+                self.send('new_microcontrolleur', {'type': 'new_microcontrolleur', 'data': payload})
+            elif channel == 'new_alert':
+                alerts.append(payload)
+            elif channel == 'new_presence':
+                presences.append(payload)
+        self.flush(conn, new_data)
+        self.emit_people(conn, alerts, presences)
+        # Lag from the reader picking the notification up to its emit (throttled rooms excluded)
+        now = time.monotonic()
+        for channel, _, enqueued in batch:
+            NOTIFY_TO_EMIT.observe(now - enqueued, channel)
+
+    def emit_people(self, conn, alerts, presences):
+        # Alerts go to the alerts room; both alerts and presences also reach the
+        # rooms of the student's class when someone watches a class
+        classes = {}
+        etudiant_ids = [p['etudiantid'] for p in alerts + presences if p.get('etudiantid')]
+        if etudiant_ids and self.subscriptions.has_kind('classe'):
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT id, classeid FROM etudiants WHERE id = ANY(%s)", (etudiant_ids,))
+                classes = dict(cursor.fetchall())
+
+        for payload in alerts:
+            rooms = [BROADCAST_ROOM, ALERTS_ROOM] + self.rooms_for('classe', classes.get(payload['etudiantid']))
+            self.send('new_alert', {'type': 'new_alert', 'data': format_alert(payload)}, to=rooms)
+        for payload in presences:
+            rooms = [BROADCAST_ROOM] + self.rooms_for('classe', classes.get(payload['etudiantid']))
+            self.send('new_presence', {'type': 'new_presence', 'data': format_presence(payload)}, to=rooms)
+
+    def rooms_for(self, kind, key, rows=None):
+        # Unthrottled rooms to emit to now; rate-limited variants get `rows` buffered instead
+        if key is None:
+            return []
+        base = room_name(kind, key)
+        rooms = []
+        for rate_ms in self.subscriptions.rates(base):
+            if not rate_ms:
+                rooms.append(base)
+            elif rows is not None:
+                self.throttle.offer(room_name(kind, key, rate_ms), rate_ms, rows)
+        return rooms
+
+    def resolve(self, conn, payloads):
+        # NEW_DATA_QUERY rows for these new_data payloads, handed to the row hooks
+        with conn.cursor() as cursor:
+            cursor.execute(NEW_DATA_QUERY, new_data_lookup(payloads))
+            rows = cursor.fetchall()
+        for hook in self.row_hooks:
+            hook(rows)
+        return rows
+
+    def flush(self, conn, payloads):
+        if not payloads:
+            return
+        rows = self.resolve(conn, payloads)
+        for hook in self.leader_row_hooks:
+            hook(rows)
+
+        if self.legacy_events:
+            for row in rows:
+                data = format_sensor_data(row)
+                rooms = [BROADCAST_ROOM] + self.rooms_for('mc', row[8], [data]) + \
+                    self.rooms_for('type', row[4], [data])
+                self.send('new_data', {'type': 'new_data', 'data': data}, to=rooms)
+            return
+
+        frames = {}
+        by_type = {}
+        for row in rows:
+            frame = frames.get(row[8])
+            if frame is None:
+                frame = frames[row[8]] = {
+                    'type': 'new_data_batch',
+                    'microcontrolleurid': row[8],
+                    'microcontrolleur': row[7],
+                    'data': []
+                }
+            data = format_sensor_data(row)
+            frame['data'].append(data)
+            by_type.setdefault(row[4], []).append(data)
+        for mc_id, frame in frames.items():
+            rooms = [BROADCAST_ROOM] + self.rooms_for('mc', mc_id, frame['data'])
+            self.send('new_data', frame, to=rooms)
+        if self.subscriptions.has_kind('type'):
+            for etat, data in by_type.items():
+                rooms = self.rooms_for('type', etat, data)
+                if rooms:
+                    self.send('new_data', {'type': 'new_data_batch', 'etat': etat, 'data': data}, to=rooms)
+        logger.debug("Emitted %d new_data rows in %d frames", len(rows), len(frames))
+
+    def stats(self):
+        return {
+            'queue_depth': len(self.queue),
+            'queue_maxsize': self.queue.maxsize,
+            'dropped': dict(self.queue.dropped),
+            'reconnects': self.reconnects,
+            'leader': self.is_leader
+        }
+
+
+def backoff_delay(attempt, max_backoff):
+    # Full-jitter exponential backoff
+    return random.uniform(0, min(max_backoff, 0.5 * 2 ** min(attempt, 10)))
@@ -0,0 +1,128 @@
+# backend/utils/rollups.py
+from sqlalchemy import func
+from sqlalchemy.sql import text
+from ..models.db import db, DonneeCapteur, DonneeCapteurMinute, DonneeCapteurHeure
+
+# (name, granularity in seconds, model), finest first
+ROLLUPS = [
+    ('minute', 60, DonneeCapteurMinute),
+    ('hour', 3600, DonneeCapteurHeure),
+]
+
+ROLLUP_SQL = """
+    INSERT INTO {table} AS r (capteurid, bucket, count, sum, min, max, last, last_timestamp)
+    SELECT capteurid, date_trunc('{unit}', timestamp), count(*), sum(valeur), min(valeur), max(valeur),
+           (array_agg(valeur ORDER BY timestamp DESC, id DESC))[1], max(timestamp)
+    FROM {source}
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (capteurid, bucket) DO UPDATE SET
+        count = r.count + EXCLUDED.count,
+        sum = r.sum + EXCLUDED.sum,
+        min = LEAST(r.min, EXCLUDED.min),
+        max = GREATEST(r.max, EXCLUDED.max),
+        last = CASE WHEN EXCLUDED.last_timestamp >= r.last_timestamp THEN EXCLUDED.last ELSE r.last END,
+        last_timestamp = GREATEST(r.last_timestamp, EXCLUDED.last_timestamp)
+"""
+
+ID_RANGE_SOURCE = "donneescapteurs WHERE id > :start AND id <= :end"
+
+# An ingest batch as a row source; ordinality stands in for the id (insert order)
+SAMPLES_SOURCE = """
+    unnest(CAST(:capteurids AS integer[]), CAST(:valeurs AS double precision[]),
+           CAST(:timestamps AS timestamp[])) WITH ORDINALITY AS s(capteurid, valeur, timestamp, id)
+"""
+
+
+def rollup_rows(source, params, suffix=''):
+    for name, _, model in ROLLUPS:
+        db.session.execute(text(ROLLUP_SQL.format(table=model.__tablename__ + suffix, unit=name, source=source)),
+                           params)
+
+
+def update_rollups(rows):
+    # Folds an ingest batch ({'capteurid', 'valeur', 'timestamp'} dicts, in insert order)
+    # into every rollup, in the ingest transaction, without reading donneescapteurs back
+    if rows:
+        rollup_rows(SAMPLES_SOURCE, {
+            'capteurids': [row['capteurid'] for row in rows],
+            'valeurs': [row['valeur'] for row in rows],
+            'timestamps': [row['timestamp'] for row in rows]
+        })
+
+
+def committed_high_id():
+    # Highest donneescapteurs id once every insert in flight has committed or rolled
+    # back; a SHARE lock waits for them (new inserts wait only that long), so no row
+    # with a smaller id can appear afterwards
+    db.session.execute(text("LOCK TABLE donneescapteurs IN SHARE MODE"))
+    return db.session.query(func.max(DonneeCapteur.id)).scalar() or 0
+
+
+def fold_range(low, high, chunk_size, suffix, log):
+    # Rolls ids in (low, high] into the staging tables, one id range per transaction
+    chunks = 0
+    for start in range(low, high, chunk_size):
+        end = min(start + chunk_size, high)
+        rollup_rows(ID_RANGE_SOURCE, {'start': start, 'end': end}, suffix)
+        db.session.commit()
+        chunks += 1
+        log(f"Rolled up ids {start + 1}..{end}")
+    return chunks
+
+
+def backfill_rollups(chunk_size=100000, log=print):
+    # Rebuilds the rollups from raw history into staging tables while the live ones keep
+    # serving and being updated by ingest, then swaps them in one transaction. History
+    # is frozen at a committed id bound; rows ingested meanwhile are folded in by short
+    # catch-up passes and, under the swap's lock, a last one.
+    suffix = '_backfill'
+    for _, _, model in ROLLUPS:
+        table = model.__tablename__
+        db.session.execute(text(f"DROP TABLE IF EXISTS {table}{suffix}"))
+        db.session.execute(text(f"CREATE TABLE {table}{suffix} (LIKE {table} INCLUDING ALL)"))
+    db.session.commit()
+
+    high = committed_high_id()
+    db.session.commit()
+    low = (db.session.query(func.min(DonneeCapteur.id)).scalar() or 1) - 1
+    chunks = fold_range(low, high, chunk_size, suffix, log)
+
+    # Catch up until what is left is small enough to fold while ingest waits
+    while True:
+        caught_up = committed_high_id()
+        db.session.commit()
+        if caught_up - high <= chunk_size:
+            break
+        chunks += fold_range(high, caught_up, chunk_size, suffix, log)
+        high = caught_up
+
+    final = committed_high_id()
+    rollup_rows(ID_RANGE_SOURCE, {'start': high, 'end': final}, suffix)
+    for _, _, model in ROLLUPS:
+        table = model.__tablename__
+        db.session.execute(text(f"ALTER TABLE {table}{suffix} ADD CONSTRAINT {table}_capteurid_fkey "
+                                f"FOREIGN KEY (capteurid) REFERENCES capteurs (id)"))
+        db.session.execute(text(f"DROP TABLE {table}"))
+        db.session.execute(text(f"ALTER TABLE {table}{suffix} RENAME TO {table}"))
+        db.session.execute(text(f"ALTER INDEX {table}{suffix}_pkey RENAME TO {table}_pkey"))
+    db.session.commit()
+    return chunks + 1
+
+
+def plan_rollup(bucket_seconds, since, until):
+    # Coarsest rollup whose buckets nest inside the requested buckets and whose
+    # boundaries line up with the requested range; None means use raw rows
+    for _, granularity, model in reversed(ROLLUPS):
+        if bucket_seconds % granularity:
+            continue
+        if any(bound is not None and not is_aligned(bound, granularity) for bound in (since, until)):
+            continue
+        return model
+    return None
+
+
+def is_aligned(moment, granularity):
+    # Rollup granularities are at most one hour, so minutes and seconds decide alignment
+    return moment.microsecond == 0 and (moment.minute * 60 + moment.second) % granularity == 0
+
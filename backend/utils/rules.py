@@ -0,0 +1,389 @@
+# backend/utils/rules.py
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from datetime import timezone
+from sqlalchemy import event, func, insert
+from sqlalchemy.orm import Session
+from ..config import Config
+from ..models.db import db, Alerte, Capteur
+from .latest import latest_store
+from .timestamps import utc_now
+
+logger = logging.getLogger(__name__)
+
+ALERT_STATUS = 'active'
+RATE_BUFFER_SIZE = 32
+
+
+class RingBuffer:
+    # Fixed-capacity (time, value) window backed by two flat double arrays;
+    # when full, the oldest sample is overwritten
+    __slots__ = ('times', 'values', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def append(self, t, value):
+        capacity = len(self.times)
+        index = (self.start + self.size) % capacity
+        self.times[index] = t
+        self.values[index] = value
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def drop_before(self, t):
+        capacity = len(self.times)
+        while self.size and self.times[self.start] < t:
+            self.start = (self.start + 1) % capacity
+            self.size -= 1
+
+    def oldest(self):
+        return self.times[self.start], self.values[self.start]
+
+    def copy(self):
+        clone = RingBuffer.__new__(RingBuffer)
+        clone.times, clone.values = array('d', self.times), array('d', self.values)
+        clone.start, clone.size = self.start, self.size
+        return clone
+
+
+class RuleState:
+    # Per (sensor, rule) state: whether the condition currently holds, when it last
+    # raised an alert, and kind-specific fields (seen: epoch of the last sample, None
+    # until the sensor has sent anything)
+    __slots__ = ('active', 'fired_at', 'since', 'buffer', 'seen')
+
+    def __init__(self, buffer=None):
+        self.active = False
+        self.fired_at = None
+        self.since = None
+        self.buffer = buffer
+        self.seen = None
+
+    def copy(self):
+        clone = RuleState(self.buffer.copy() if self.buffer is not None else None)
+        clone.active, clone.fired_at, clone.since, clone.seen = self.active, self.fired_at, self.since, self.seen
+        return clone
+
+
+def epoch(moment):
+    # Stored timestamps are naive UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class Rule(ABC):
+    kind = None
+
+    def __init__(self, name, metric, cooldown):
+        self.name = name
+        self.metric = metric
+        self.cooldown = cooldown
+
+    def new_state(self):
+        return RuleState()
+
+    @abstractmethod
+    def check(self, state, t, value):
+        # True while the sample breaches the rule
+        ...
+
+
+class ThresholdRule(Rule):
+    kind = 'threshold'
+
+    def __init__(self, name, metric, cooldown, above=None, below=None):
+        super().__init__(name, metric, cooldown)
+        if above is None and below is None:
+            raise ValueError(f"Rule {name} needs 'above' or 'below'")
+        self.above = above
+        self.below = below
+
+    def breached(self, value):
+        return (self.above is not None and value > self.above) or \
+            (self.below is not None and value < self.below)
+
+    def check(self, state, t, value):
+        return self.breached(value)
+
+
+class SustainedRule(ThresholdRule):
+    # The threshold must hold on every sample for `seconds`
+    kind = 'sustained'
+
+    def __init__(self, name, metric, cooldown, seconds, above=None, below=None):
+        super().__init__(name, metric, cooldown, above, below)
+        self.seconds = seconds
+
+    def check(self, state, t, value):
+        if not self.breached(value):
+            state.since = None
+            return False
+        if state.since is None:
+            state.since = t
+        return t - state.since >= self.seconds
+
+
+class RateRule(Rule):
+    # Change per second between the oldest sample of the last `seconds` and this one
+    kind = 'rate'
+
+    def __init__(self, name, metric, cooldown, max_rate, seconds):
+        super().__init__(name, metric, cooldown)
+        self.max_rate = max_rate
+        self.seconds = seconds
+
+    def new_state(self):
+        return RuleState(RingBuffer(RATE_BUFFER_SIZE))
+
+    def check(self, state, t, value):
+        buffer = state.buffer
+        buffer.drop_before(t - self.seconds)
+        breached = False
+        if buffer.size:
+            oldest_t, oldest_value = buffer.oldest()
+            if t > oldest_t:
+                breached = abs(value - oldest_value) / (t - oldest_t) > self.max_rate
+        buffer.append(t, value)
+        return breached
+
+
+class HeartbeatRule(Rule):
+    # Breached when a sensor sends nothing for `seconds`; checked by sweep(), and
+    # cleared by the next sample
+    kind = 'heartbeat'
+
+    def __init__(self, name, metric, cooldown, seconds):
+        super().__init__(name, metric, cooldown)
+        self.seconds = seconds
+
+    def check(self, state, t, value):
+        return False
+
+
+RULE_KINDS = {cls.kind: cls for cls in (ThresholdRule, SustainedRule, RateRule, HeartbeatRule)}
+
+
+def build_rules(specs, default_cooldown):
+    # specs: Config.ALERT_RULES entries, e.g.
+    # {'name': 'cpu_usage_high', 'metric': 'cpu_usage', 'kind': 'threshold', 'above': 90}
+    rules = []
+    for spec in specs:
+        options = dict(spec)
+        kind = options.pop('kind')
+        if kind not in RULE_KINDS:
+            raise ValueError(f"Unknown rule kind {kind}")
+        options.setdefault('cooldown', default_cooldown)
+        rules.append(RULE_KINDS[kind](**options))
+    return rules
+
+
+class RuleEngine:
+    # Rules are grouped by metric (Capteur.etat) and compiled into one lookup table
+    # entry per sensor, so evaluating a sample is a dict lookup plus its few rules.
+    # Alerts fire when a rule starts being breached (at most once per cooldown) and
+    # re-arm once it clears.
+    #
+    # Only the elected notification listener evaluates (evaluate_rows and the heartbeat
+    # sweep), so alerts are de-duplicated across workers. evaluate() and sweep() work
+    # on copies of the states they touch and return them with the alerts; stage()
+    # applies them when the transaction writing those alerts commits, so a rollback
+    # neither loses an alert nor leaves state for one.
+    def __init__(self, rules):
+        self.rules_by_metric = {}
+        for rule in rules:
+            self.rules_by_metric.setdefault(rule.metric, []).append(rule)
+        self.rule_names = {rule.name for rule in rules}
+        self._lock = threading.Lock()
+        self._rules = {}  # capteurid -> (rule, ...)
+        self._states = {}  # capteurid -> [state per rule]
+        self._heartbeats = []  # (capteurid, position, rule)
+        self.evaluated = 0
+        self.fired = 0
+
+    def register(self, capteur_id, metric, last_seen=None, active=None):
+        # Compiles one sensor; last_seen (epoch) and active ({rule name: epoch fired})
+        # restore what a previous process knew, from the latest store and the
+        # alertes table
+        rules = tuple(self.rules_by_metric.get(metric, ()))
+        states = []
+        for rule in rules:
+            state = rule.new_state()
+            state.seen = last_seen
+            if active and rule.name in active:
+                state.active = True
+                state.fired_at = active[rule.name]
+            states.append(state)
+        with self._lock:
+            if capteur_id in self._rules:
+                return
+            self._rules[capteur_id] = rules
+            self._states[capteur_id] = states
+            self._heartbeats.extend((capteur_id, position, rule) for position, rule in enumerate(rules)
+                                    if rule.kind == 'heartbeat')
+
+    def compile(self, capteur_ids):
+        # Loads the metric, active alerts and last-seen time of sensors not compiled yet
+        with self._lock:
+            missing = {capteur_id for capteur_id in capteur_ids if capteur_id not in self._rules}
+        if not missing:
+            return
+        metrics = dict(db.session.query(Capteur.id, Capteur.etat).filter(Capteur.id.in_(missing)).all())
+        active = {}
+        if self.rule_names:
+            rows = db.session.query(Alerte.capteurid, Alerte.type, func.max(Alerte.dateheure)).\
+                filter(Alerte.statut == ALERT_STATUS, Alerte.capteurid.in_(missing),
+                       Alerte.type.in_(self.rule_names)).\
+                group_by(Alerte.capteurid, Alerte.type).all()
+            for capteur_id, name, fired_at in rows:
+                active.setdefault(capteur_id, {})[name] = epoch(fired_at)
+        for capteur_id in missing:
+            last_seen = latest_store.last_seen(capteur_id)
+            self.register(capteur_id, metrics.get(capteur_id), epoch(last_seen) if last_seen else None,
+                          active.get(capteur_id))
+
+    def fire(self, rule, state, t):
+        # Returns True when the breach should produce an Alerte row
+        if state.active:
+            return False
+        state.active = True
+        if state.fired_at is not None and t - state.fired_at < rule.cooldown:
+            return False
+        state.fired_at = t
+        return True
+
+    def evaluate(self, rows):
+        # rows: the {'capteurid', 'valeur', 'timestamp'} dicts being inserted;
+        # returns (Alerte rows to insert, pending states for stage())
+        if not self.rules_by_metric:
+            return [], {}
+        self.compile({row['capteurid'] for row in rows})
+        alerts = []
+        pending = {}
+        with self._lock:
+            for row in sorted(rows, key=lambda row: epoch(row['timestamp'])):
+                capteur_id = row['capteurid']
+                rules = self._rules.get(capteur_id)
+                if not rules:
+                    continue
+                states = pending.get(capteur_id)
+                if states is None:
+                    states = pending[capteur_id] = [state.copy() for state in self._states[capteur_id]]
+                t = epoch(row['timestamp'])
+                for rule, state in zip(rules, states):
+                    state.seen = max(state.seen or t, t)
+                    if not rule.check(state, t, row['valeur']):
+                        state.active = False
+                    elif self.fire(rule, state, t):
+                        alerts.append({'type': rule.name, 'dateheure': row['timestamp'],
+                                       'statut': ALERT_STATUS, 'capteurid': capteur_id})
+        return alerts, pending
+
+    def stage(self, session, pending, evaluated, alerts):
+        # Applied by apply_rule_states once the session commits
+        session.info.setdefault('rule_states', []).append((pending, evaluated, len(alerts)))
+
+    def apply(self, pending, evaluated=0, fired=0):
+        with self._lock:
+            for capteur_id, states in pending.items():
+                current = self._states.get(capteur_id)
+                if current is None:
+                    continue
+                # Keep newer samples applied meanwhile by the other thread (rows vs sweep)
+                for state, previous in zip(states, current):
+                    if previous.seen is not None and (state.seen is None or previous.seen > state.seen):
+                        state.seen = previous.seen
+                self._states[capteur_id] = states
+            self.evaluated += evaluated
+            self.fired += fired
+
+    def sweep(self, now=None):
+        # Alerte rows for sensors that have been silent longer than their heartbeat rule
+        # allows; sensors that never sent anything are not expected to
+        now = now or time.time()
+        alerts = []
+        pending = {}
+        with self._lock:
+            for capteur_id, position, rule in self._heartbeats:
+                state = self._states[capteur_id][position]
+                if state.seen is None or now - state.seen <= rule.seconds or state.active:
+                    continue
+                states = pending.get(capteur_id)
+                if states is None:
+                    states = pending[capteur_id] = [state.copy() for state in self._states[capteur_id]]
+                if self.fire(rule, states[position], now):
+                    alerts.append({'type': rule.name, 'dateheure': utc_now(),
+                                   'statut': ALERT_STATUS, 'capteurid': capteur_id})
+        return alerts, pending
+
+    def stats(self):
+        with self._lock:
+            return {'rules': sum(len(rules) for rules in self.rules_by_metric.values()),
+                    'sensors': len(self._rules), 'evaluated': self.evaluated, 'fired': self.fired}
+
+
+rule_engine = RuleEngine(build_rules(Config.ALERT_RULES, Config.ALERT_COOLDOWN))
+
+
+def evaluate_rows(app, rows):
+    # Row hook of the elected notification listener: rows are committed NEW_DATA_QUERY
+    # rows from every worker, so one engine sees each sensor's full sample stream
+    samples = [{'capteurid': row[1], 'valeur': row[2], 'timestamp': row[3]} for row in rows]
+    with app.app_context():
+        try:
+            alerts, pending = rule_engine.evaluate(samples)
+            if alerts:
+                db.session.execute(insert(Alerte).values(alerts))
+            rule_engine.stage(db.session, pending, len(samples), alerts)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error evaluating alert rules: {str(e)}")
+
+
+def load_heartbeat_sensors(engine):
+    # Compiles every sensor, including boards registered through other workers, so
+    # sensors that never sent anything to this process are covered too
+    latest_store.ensure_loaded()
+    engine.compile([capteur_id for capteur_id, in db.session.query(Capteur.id).all()])
+
+
+def run_heartbeats_forever(app, engine, should_run):
+    # Background loop started by app.py; should_run() limits the sweep to the worker
+    # elected as notification listener, the only one seeing every board's data
+    while True:
+        time.sleep(app.config['ALERT_HEARTBEAT_INTERVAL'])
+        if not should_run():
+            continue
+        with app.app_context():
+            try:
+                load_heartbeat_sensors(engine)
+                alerts, pending = engine.sweep()
+                if alerts:
+                    db.session.execute(insert(Alerte).values(alerts))
+                    engine.stage(db.session, pending, 0, alerts)
+                    db.session.commit()
+                    logger.info(f"Raised {len(alerts)} missing-heartbeat alerts")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error in heartbeat sweep: {str(e)}")
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_rule_states(session):
+    for pending, evaluated, fired in session.info.pop('rule_states', ()):
+        rule_engine.apply(pending, evaluated, fired)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rule_states(session):
+    session.info.pop('rule_states', None)
@@ -0,0 +1,52 @@
+# backend/utils/sensor_query.py
+from ..models.db import db, Microcontrolleur, TypeCapteur, Capteur, DonneeCapteur
+from .pagination import parse_int_list, parse_str_list, parse_time_range
+
+
+def parse_sensor_filters(args):
+    since, until = parse_time_range(args)
+    return {
+        'since': since,
+        'until': until,
+        'microcontrolleur': parse_int_list(args, 'microcontrolleur'),
+        'capteurid': parse_int_list(args, 'capteurid'),
+        'etat': parse_str_list(args, 'etat')
+    }
+
+
+def apply_sensor_filters(query, filters, timestamp_column=DonneeCapteur.timestamp,
+                         capteurid_column=DonneeCapteur.capteurid):
+    # The column arguments let rollup tables reuse the same filters
+    if filters['since']:
+        query = query.filter(timestamp_column >= filters['since'])
+    if filters['until']:
+        query = query.filter(timestamp_column < filters['until'])
+    if filters['microcontrolleur']:
+        query = query.filter(Capteur.microcontrolleurid.in_(filters['microcontrolleur']))
+    if filters['capteurid']:
+        query = query.filter(capteurid_column.in_(filters['capteurid']))
+    if filters['etat']:
+        query = query.filter(Capteur.etat.in_(filters['etat']))
+    return query
+
+
+def sensor_data_query(filters):
+    # Raw rows joined to their sensor, type and board
+    query = db.session.query(DonneeCapteur, Capteur, TypeCapteur, Microcontrolleur).\
+        join(Capteur, DonneeCapteur.capteurid == Capteur.id).\
+        join(TypeCapteur, Capteur.typecapteurid == TypeCapteur.id).\
+        join(Microcontrolleur, Capteur.microcontrolleurid == Microcontrolleur.id)
+    return apply_sensor_filters(query, filters)
+
+
+def serialize_sensor_row(data):
+    return {
+        'capteurid': data.DonneeCapteur.capteurid,
+        'type': data.TypeCapteur.nom,
+        'etat': data.Capteur.etat,
+        'valeur': data.DonneeCapteur.valeur,
+        'unite': data.TypeCapteur.unite,
+        'calibrated': True,
+        'timestamp': data.DonneeCapteur.timestamp.isoformat() + 'Z',
+        'microcontrolleur': data.Microcontrolleur.nom
+    }
@@ -0,0 +1,117 @@
+# backend/utils/subscriptions.py
+import threading
+import time
+
+# Clients that never subscribed stay in this room and keep receiving everything
+BROADCAST_ROOM = 'all'
+ALERTS_ROOM = 'alerts'
+
+
+def room_name(kind, key, rate_ms=0):
+    # e.g. 'mc:5', 'type:temperature', 'classe:3', 'mc:5@500' (rate-limited variant)
+    return rated_room(f'{kind}:{key}', rate_ms)
+
+
+def rated_room(base, rate_ms):
+    return f'{base}@{rate_ms}' if rate_ms else base
+
+
+class Subscriptions:
+    # Reference counts of the rooms clients of this process joined, so the emitter
+    # only builds frames for rooms that have someone listening. With a message queue
+    # the clients live in other workers too: every worker publishes its counts and the
+    # emitter also honours the rooms of the others (see NotificationListener.sync).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rooms = {}  # base room -> {rate_ms: count}
+        self._by_sid = {}  # sid -> [(base room, rate_ms)]
+        self._remote = {}  # base room -> {rate_ms} subscribed in any worker
+        self.changed = threading.Event()
+
+    def replace(self, sid, entries):
+        with self._lock:
+            self._remove(sid)
+            self._by_sid[sid] = list(entries)
+            for base, rate_ms in entries:
+                rates = self._rooms.setdefault(base, {})
+                rates[rate_ms] = rates.get(rate_ms, 0) + 1
+        self.changed.set()
+
+    def remove(self, sid):
+        with self._lock:
+            entries = self._remove(sid)
+        if entries:
+            self.changed.set()
+        return entries
+
+    def _remove(self, sid):
+        entries = self._by_sid.pop(sid, [])
+        for base, rate_ms in entries:
+            rates = self._rooms[base]
+            rates[rate_ms] -= 1
+            if not rates[rate_ms]:
+                del rates[rate_ms]
+            if not rates:
+                del self._rooms[base]
+        return entries
+
+    def counts(self):
+        # [(base room, rate_ms, clients)] of this process
+        with self._lock:
+            return [(base, rate_ms, count) for base, rates in self._rooms.items() for rate_ms, count in rates.items()]
+
+    def set_remote(self, rooms):
+        # rooms: [(base room, rate_ms)] subscribed across all workers
+        remote = {}
+        for base, rate_ms in rooms:
+            remote.setdefault(base, set()).add(rate_ms)
+        self._remote = remote
+
+    def rates(self, base):
+        # rate_ms values subscribed for a base room; 0 means unthrottled
+        with self._lock:
+            rates = set(self._rooms.get(base, ()))
+        return sorted(rates | self._remote.get(base, set()))
+
+    def has_kind(self, kind):
+        prefix = f'{kind}:'
+        with self._lock:
+            if any(base.startswith(prefix) for base in self._rooms):
+                return True
+        return any(base.startswith(prefix) for base in self._remote)
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._by_sid),
+                    'rooms': sum(len(rates) for rates in self._rooms.values()),
+                    'remote_rooms': sum(len(rates) for rates in self._remote.values())}
+
+
+class RoomThrottle:
+    # Last-value-wins buffer per rate-limited room: at most one value per sensor
+    # is sent per interval, and only the newest one
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # room -> {capteurid: data}
+        self._next_due = {}  # room -> monotonic time
+
+    def offer(self, room, rate_ms, rows):
+        with self._lock:
+            pending = self._pending.setdefault(room, {})
+            for data in rows:
+                pending[data['capteurid']] = data
+            self._next_due.setdefault(room, time.monotonic() + rate_ms / 1000)
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    def due(self):
+        # [(room, [data])] whose interval elapsed; the next window opens on send
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for room, due_at in list(self._next_due.items()):
+                if due_at <= now:
+                    del self._next_due[room]
+                    ready.append((room, list(self._pending.pop(room).values())))
+        return ready
@@ -0,0 +1,14 @@
+# backend/utils/timestamps.py
+from datetime import datetime, timezone
+
+
+def to_utc_naive(timestamp):
+    # Stored timestamps are naive UTC; aware values (a Z or an offset from a client or
+    # a board) are converted so they compare with each other and with the columns
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,255 @@
+# backend/utils/timetable.py
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from ..config import Config
+from ..models.db import db, Classe, Cours, EmploiDuTemps, Etudiant
+
+logger = logging.getLogger(__name__)
+
+# EmploiDuTemps.emploidutemps is a weekly timetable, either keyed by day
+#   {"lundi": [{"debut": "08:00", "fin": "10:00", "coursid": 3, "enseignantid": 7}, ...], ...}
+# or a flat list of slots carrying their day: [{"jour": "lundi", "debut": ..., ...}, ...]
+# Days are French or English names, or 0-6 (Monday = 0). "cours" (a name) may replace
+# "coursid"; the course's teacher is taken from Cours when the slot doesn't name one.
+DAYS = {name: index for names in (('lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche'),
+                                  ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'))
+        for index, name in enumerate(names)}
+
+ABSENCES_SQL = """
+    INSERT INTO presences (etudiantid, statut, date_heure)
+    SELECT e.id, 'absent', s.debut
+    FROM unnest(CAST(:classes AS integer[]), CAST(:starts AS timestamp[]), CAST(:ends AS timestamp[]))
+        AS s(classeid, debut, fin)
+    JOIN etudiants e ON e.classeid = s.classeid
+    WHERE NOT EXISTS (
+        SELECT 1 FROM presences p
+        WHERE p.etudiantid = e.id
+          AND p.date_heure >= s.debut - CAST(:early AS interval)
+          AND p.date_heure < s.fin
+    )
+"""
+
+
+def parse_day(value):
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        day = int(value)
+        if 0 <= day <= 6:
+            return day
+    elif isinstance(value, str) and value.lower() in DAYS:
+        return DAYS[value.lower()]
+    raise ValueError(f'Unknown day {value!r}')
+
+
+def parse_minutes(value):
+    # 'HH:MM' (or 'HH:MM:SS', 'HHhMM') -> minutes since midnight
+    parts = str(value).replace('h', ':').split(':')
+    return int(parts[0]) * 60 + (int(parts[1]) if len(parts) > 1 and parts[1] else 0)
+
+
+def iter_slots(timetable):
+    # Yields (day, slot dict) from either timetable layout
+    if isinstance(timetable, dict):
+        for day, slots in timetable.items():
+            for slot in slots or ():
+                yield parse_day(day), slot
+    else:
+        for slot in timetable or ():
+            yield parse_day(slot.get('jour', slot.get('day'))), slot
+
+
+def build_days(timetables, courses):
+    # One entry per weekday: (starts, ends, max end so far, slots), sorted by start
+    days = [[] for _ in range(7)]
+    for timetable in timetables:
+        for day, slot in iter_slots(timetable):
+            start, end = parse_minutes(slot['debut']), parse_minutes(slot['fin'])
+            if end <= start:
+                raise ValueError(f"Slot ends before it starts: {slot}")
+            coursid = slot.get('coursid')
+            course = courses.get(coursid, {})
+            days[day].append((start, end, {
+                'coursid': coursid,
+                'cours': slot.get('cours') or course.get('nom'),
+                'enseignantid': slot.get('enseignantid') or course.get('enseignantid'),
+                'debut': f'{start // 60:02d}:{start % 60:02d}',
+                'fin': f'{end // 60:02d}:{end % 60:02d}'
+            }))
+    index = []
+    for entries in days:
+        entries.sort(key=lambda entry: entry[0])
+        reach, latest = [], 0
+        for _, end, _ in entries:
+            latest = max(latest, end)
+            reach.append(latest)
+        index.append(([entry[0] for entry in entries], [entry[1] for entry in entries], reach,
+                      [entry[2] for entry in entries]))
+    return index
+
+
+class TimetableIndex:
+    # Parsed weekly timetables per Classe as sorted interval lists, so "which slot is
+    # running at T" is a bisect. Readers never lock: updates swap in a new dict.
+    def __init__(self, reload_interval=300):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._classes = {}
+        self._stale = set()
+        self._loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def __len__(self):
+        return len(self._classes)
+
+    def _build(self, classe_ids=None):
+        query = db.session.query(EmploiDuTemps.classeid, EmploiDuTemps.emploidutemps)
+        if classe_ids is not None:
+            query = query.filter(EmploiDuTemps.classeid.in_(classe_ids))
+        timetables = {}
+        for classeid, timetable in query.all():
+            timetables.setdefault(classeid, []).append(timetable)
+
+        coursids = {slot.get('coursid') for tables in timetables.values() for timetable in tables
+                    for _, slot in iter_slots(timetable)} - {None}
+        courses = {}
+        if coursids:
+            courses = {cours_id: {'nom': nom, 'enseignantid': enseignantid} for cours_id, nom, enseignantid in
+                       db.session.query(Cours.id, Cours.nom, Cours.enseignantid).filter(Cours.id.in_(coursids))}
+
+        built = {}
+        for classeid, tables in timetables.items():
+            try:
+                built[classeid] = build_days(tables, courses)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring the timetable of class {classeid}: {str(e)}")
+        return built
+
+    def load(self):
+        built = self._build()
+        with self._lock:
+            self._classes = built
+            self._stale.clear()
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded the timetables of {len(built)} classes")
+
+    def refresh(self, classe_ids):
+        built = self._build(classe_ids)
+        with self._lock:
+            classes = dict(self._classes)
+            for classeid in classe_ids:
+                classes.pop(classeid, None)
+            classes.update(built)
+            self._classes = classes
+            self._stale.difference_update(classe_ids)
+
+    def ensure_loaded(self):
+        # Full reloads pick up changes made by other processes; local commits only
+        # rebuild the classes they touched
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_interval:
+            self.load()
+        elif self._stale:
+            self.refresh(set(self._stale))
+
+    def mark_stale(self, classe_ids):
+        with self._lock:
+            self._stale.update(classe_ids)
+
+    def active_slot(self, classeid, when):
+        days = self._classes.get(classeid)
+        if days is None:
+            return None
+        starts, ends, reach, slots = days[when.weekday()]
+        minute = when.hour * 60 + when.minute + when.second / 60
+        position = bisect.bisect_right(starts, minute) - 1
+        # Walk back only while an earlier slot can still be running
+        while position >= 0 and reach[position] > minute:
+            if ends[position] > minute:
+                return slots[position]
+            position -= 1
+        return None
+
+    def slots_on(self, classe_ids, day):
+        # (classeid, start, end) datetimes of every slot of these classes on `day`
+        classes = self._classes
+        for classeid in classe_ids:
+            days = classes.get(classeid)
+            if days is None:
+                continue
+            starts, ends, _, _ = days[day.weekday()]
+            midnight = datetime.combine(day, datetime.min.time())
+            for start, end in zip(starts, ends):
+                yield classeid, midnight + timedelta(minutes=start), midnight + timedelta(minutes=end)
+
+
+timetable_index = TimetableIndex(Config.TIMETABLE_INDEX_RELOAD)
+
+
+def resolve_events(events, late_minutes):
+    # events: [(etudiantid, datetime)] -> one dict per event with the running slot, if any,
+    # and whether the student is on time ('present') or late
+    timetable_index.ensure_loaded()
+    etudiant_ids = {etudiantid for etudiantid, _ in events}
+    classes = dict(db.session.query(Etudiant.id, Etudiant.classeid).filter(Etudiant.id.in_(etudiant_ids)).all())
+    results = []
+    for etudiantid, when in events:
+        classeid = classes.get(etudiantid)
+        slot = timetable_index.active_slot(classeid, when) if classeid is not None else None
+        result = {'etudiantid': etudiantid, 'date_heure': when.isoformat(), 'classeid': classeid,
+                  'slot': slot, 'statut': None}
+        if slot is not None:
+            started = when.hour * 60 + when.minute - parse_minutes(slot['debut'])
+            result['statut'] = 'present' if started <= late_minutes else 'late'
+        results.append(result)
+    return results
+
+
+def record_absences(day, etablissement_id, early_minutes, now=None):
+    # One INSERT ... SELECT per establishment: an 'absent' Presence at the start of every
+    # slot of `day` for each student of the class without a presence during that slot
+    # (or up to early_minutes before it). Slots that have not ended by `now` are left
+    # for a later run; re-running it adds nothing.
+    now = now or datetime.now()
+    classe_ids = [classeid for classeid, in
+                  db.session.query(Classe.id).filter(Classe.etablissementid == etablissement_id)]
+    slots = [slot for slot in timetable_index.slots_on(classe_ids, day) if slot[2] <= now]
+    if not slots:
+        return 0
+    result = db.session.execute(text(ABSENCES_SQL), {
+        'classes': [classeid for classeid, _, _ in slots],
+        'starts': [start for _, start, _ in slots],
+        'ends': [end for _, _, end in slots],
+        'early': f'{int(early_minutes)} minutes'
+    })
+    db.session.commit()
+    return result.rowcount
+
+
+# Rebuild the classes whose timetable changed through this process once the
+# transaction commits (other processes catch up on the next full reload)
+@event.listens_for(Session, 'after_flush')
+def collect_timetable_changes(session, flush_context):
+    changed = session.info.setdefault('timetable_changes', set())
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, EmploiDuTemps):
+            changed.add(obj.classeid)
+            changed.update(inspect(obj).attrs.classeid.history.deleted or ())
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_timetable_changes(session):
+    changed = session.info.pop('timetable_changes', None)
+    if changed and timetable_index.loaded:
+        timetable_index.mark_stale(changed - {None})
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_timetable_changes(session):
+    session.info.pop('timetable_changes', None)
@@ -0,0 +1,246 @@
+# backend/utils/video.py
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.sql import text
+from ..models.db import db
+from .embeddings import embedding_index
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+# Camera clips are named video_YYYY-MM-DD_HH-MM-SS.mp4
+CLIP_NAME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})')
+THUMBNAIL_SIZE = (16, 16)
+
+# Skips students already marked present for this clip, so a batch committed just
+# before a crash (checkpoint not saved yet) is not recorded twice on resume
+INSERT_PRESENCES_SQL = """
+    INSERT INTO presences (etudiantid, statut, date_heure)
+    SELECT v.etudiantid, 'present', v.date_heure
+    FROM unnest(CAST(:etudiants AS integer[]), CAST(:moments AS timestamp[])) AS v(etudiantid, date_heure)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM presences p
+        WHERE p.etudiantid = v.etudiantid AND p.statut = 'present'
+          AND p.date_heure >= :clip_start AND p.date_heure <= :clip_end
+    )
+"""
+
+
+def require_cv2():
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError('Video processing requires OpenCV (pip install opencv-python-headless)')
+    return cv2
+
+
+def clip_start_time(path):
+    match = CLIP_NAME_PATTERN.search(os.path.basename(path))
+    if match:
+        return datetime.fromisoformat(f"{match.group(1)}T{match.group(2)}:{match.group(3)}:{match.group(4)}")
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def iter_frames(path, sample_fps, start_frame=0):
+    # Lazily yields (frame index, seconds into the clip, BGR frame) at about sample_fps.
+    # Skipped frames are only grabbed, never converted to images.
+    cv2 = require_cv2()
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        if start_frame == 0:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield 0, 0.0, frame
+        return
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError(f'Cannot open {path}')
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, round(fps / sample_fps))
+        if start_frame:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        index = start_frame
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+class FrameDeduper:
+    # Drops frames whose 16x16 grayscale thumbnail barely differs from the last kept one
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self._last = None
+
+    def is_duplicate(self, frame):
+        cv2 = require_cv2()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+        if self._last is not None and np.abs(thumbnail - self._last).mean() < self.threshold:
+            return True
+        self._last = thumbnail
+        return False
+
+
+class CheckpointStore:
+    # One small JSON file per clip: last frame handled, students already recorded, done flag
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, clip_path):
+        # Clips from different cameras often share a name; key on the absolute path
+        digest = hashlib.sha1(os.path.abspath(clip_path).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f'{os.path.basename(clip_path)}-{digest}.json')
+
+    def load(self, clip_path):
+        try:
+            with open(self._path(clip_path)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'next_frame': 0, 'seen': [], 'done': False}
+
+    def save(self, clip_path, state):
+        path = self._path(clip_path)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+
+_detectors = {}
+
+
+def run_detector(detector_path, frames):
+    # Runs in a worker process; the detector is 'module:function' taking a list of
+    # frames and returning, per frame, a list of face embeddings
+    detector = _detectors.get(detector_path)
+    if detector is None:
+        module_name, function_name = detector_path.split(':')
+        detector = _detectors[detector_path] = getattr(importlib.import_module(module_name), function_name)
+    return [[np.asarray(embedding, dtype=np.float32) for embedding in faces] for faces in detector(frames)]
+
+
+class VideoPipeline:
+    def __init__(self, detector_path, checkpoints, sample_fps=1.0, batch_size=16, workers=2,
+                 dedup_threshold=2.0, max_distance=0.4, max_in_flight=4):
+        self.detector_path = detector_path
+        self.checkpoints = checkpoints
+        self.sample_fps = sample_fps
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dedup_threshold = dedup_threshold
+        self.max_distance = max_distance
+        self.max_in_flight = max_in_flight
+
+    def process(self, paths):
+        embedding_index.ensure_loaded()
+        reports = []
+        # Spawned, not forked: the parent may hold threads, locks and open connections
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            for path in paths:
+                reports.append(self.process_clip(pool, path))
+        return reports
+
+    def process_clip(self, pool, path):
+        state = self.checkpoints.load(path)
+        report = {'clip': path, 'decoded': 0, 'duplicates': 0, 'analyzed': 0, 'presences': 0,
+                  'resumed_from': state['next_frame'], 'skipped': state['done']}
+        if state['done']:
+            return report
+
+        started = time.monotonic()
+        clip_start = clip_start_time(path)
+        seen = set(state['seen'])
+        deduper = FrameDeduper(self.dedup_threshold)
+        in_flight = deque()
+        batch = []
+
+        def drain(limit):
+            # Results are consumed in submission order so the checkpoint only moves forward
+            while len(in_flight) > limit:
+                future, offsets, last_frame = in_flight.popleft()
+                report['presences'] += self.record(future.result(), offsets, clip_start, seen)
+                state.update(next_frame=last_frame + 1, seen=sorted(seen))
+                self.checkpoints.save(path, state)
+
+        def submit(last_frame):
+            offsets = [offset for _, offset, _ in batch]
+            frames = [frame for _, _, frame in batch]
+            in_flight.append((pool.submit(run_detector, self.detector_path, frames), offsets, last_frame))
+            batch.clear()
+            drain(self.max_in_flight)
+
+        last_frame = state['next_frame'] - 1
+        for index, offset, frame in iter_frames(path, self.sample_fps, state['next_frame']):
+            report['decoded'] += 1
+            last_frame = index
+            if deduper.is_duplicate(frame):
+                report['duplicates'] += 1
+                continue
+            batch.append((index, offset, frame))
+            report['analyzed'] += 1
+            if len(batch) >= self.batch_size:
+                submit(index)
+        if batch:
+            submit(last_frame)
+        drain(0)
+
+        state.update(next_frame=last_frame + 1, seen=sorted(seen), done=True)
+        self.checkpoints.save(path, state)
+        elapsed = time.monotonic() - started
+        report['seconds'] = round(elapsed, 3)
+        report['frames_per_second'] = round(report['decoded'] / elapsed, 2) if elapsed else None
+        logger.info(f"Processed {path}: {report}")
+        return report
+
+    def record(self, faces_per_frame, offsets, clip_start, seen):
+        # Matches every face of the batch in one index query, then bulk-inserts one
+        # Presence per student per clip (the first time they are seen)
+        probes = [face for faces in faces_per_frame for face in faces]
+        if not probes or not len(embedding_index):
+            return 0
+        owners = [offset for offset, faces in zip(offsets, faces_per_frame) for _ in faces]
+        ids, distances = embedding_index.search(np.stack(probes), 1)
+        rows = []
+        for offset, (etudiant_id,), (distance,) in zip(owners, ids.tolist(), distances.tolist()):
+            if distance <= self.max_distance and etudiant_id not in seen:
+                seen.add(etudiant_id)
+                rows.append({'etudiantid': etudiant_id, 'statut': 'present',
+                             'date_heure': clip_start + timedelta(seconds=offset)})
+        if not rows:
+            return 0
+        result = db.session.execute(text(INSERT_PRESENCES_SQL), {
+            'etudiants': [row['etudiantid'] for row in rows],
+            'moments': [row['date_heure'] for row in rows],
+            'clip_start': clip_start,
+            'clip_end': clip_start + timedelta(seconds=max(offsets))
+        })
+        db.session.commit()
+        return result.rowcount
+
+
+def collect_clips(paths):
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            clips.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(VIDEO_EXTENSIONS + IMAGE_EXTENSIONS))
+        else:
+            clips.append(path)
+    return clips
@@ -0,0 +1,7 @@
+# backend/wsgi.py
+# WSGI entry point for worker processes, e.g.
+#   gunicorn -k eventlet -w 4 backend.wsgi:app
+# Import it once per worker (no --preload) so each process starts its own threads.
+from .app import app, start_background_tasks
+
+start_background_tasks()